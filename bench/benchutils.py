@@ -0,0 +1,47 @@
+#------------------------------------------------------------------------------#
+#
+#     Copyright 2014 by Konrad R.K. Ludwig.
+#
+#     This file is part of PodBlast.
+#
+#     PodBlast is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#     PodBlast is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#   along with PodBlast. If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------#
+
+import io
+import os
+import sys
+import contextlib
+
+#------------------------------------------------------------------------------#
+#     The following helpers are shared by the benchmark scripts in 'bench/'.
+#   Importing this module makes PodBlast's own modules (in 'src/') importable,
+#   so it is imported before them.
+#------------------------------------------------------------------------------#
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    'src')
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+# Returns the command line argument at 'position', converted to the type of
+# 'default', or 'default' if it was not given:
+def get_arg (position, default):
+    if len(sys.argv) > position:
+        return type(default)(sys.argv[position])
+    return default
+
+# Returns a context in which PodBlast's console logging is discarded:
+def quiet ():
+    return contextlib.redirect_stdout(io.StringIO())
@@ -0,0 +1,161 @@
+#------------------------------------------------------------------------------#
+#
+#     Copyright 2014 by Konrad R.K. Ludwig.
+#
+#     This file is part of PodBlast.
+#
+#     PodBlast is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#     PodBlast is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#   along with PodBlast. If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------#
+
+import re
+import time
+import threading
+from email.utils import formatdate
+from xml.sax.saxutils import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from benchutils import get_arg
+
+#------------------------------------------------------------------------------#
+#     The following classes serve a catalogue of generated podcast feeds over
+#   local HTTP, so feed fetching, refreshing and importing can be measured
+#   without remote servers. Each response is delayed by the catalogue's
+#   latency to stand in for a remote server, and carries an 'ETag' so
+#   unchanged feeds are answered with '304 Not Modified'. Serving the
+#   catalogue from several servers (ports) stands in for several hosts:
+#
+#       python3 bench/feedserver.py [feeds] [episodes] [latency] [hosts]
+#------------------------------------------------------------------------------#
+
+FEED_PATH = re.compile(r'^/feeds/(\d+)\.xml$')
+
+class FixtureFeeds(object):
+    """
+    A catalogue of 'feeds' generated feeds, each starting with 'episodes'
+    episodes. 'publish()' adds episodes to feeds, changing their documents.
+    'latency' is the time in seconds taken to answer each request.
+    """
+    def __init__(self, feeds = 100, episodes = 20, latency = 0.0):
+        self.latency = latency
+        self.episode_counts = [episodes] * feeds
+        self.lock = threading.Lock()
+
+    # Adds 'episodes' new episodes to each feed numbered in 'feed_indexes':
+    def publish(self, feed_indexes, episodes = 1):
+        with self.lock:
+            for feed_index in feed_indexes:
+                self.episode_counts[feed_index] += episodes
+
+    # Returns a tuple with the 'RSS' document of a feed and its 'ETag', or
+    # 'None' if there is no such feed:
+    def get_document(self, feed_index):
+        with self.lock:
+            if feed_index >= len(self.episode_counts):
+                return None
+            episode_count = self.episode_counts[feed_index]
+        etag = '"' + str(feed_index) + '-' + str(episode_count) + '"'
+        items = []
+        for index in reversed(range(episode_count)):
+            episode_url = ('http://example.com/' + str(feed_index) + '/'
+                + str(index))
+            items.append('<item><title>Episode ' + str(index) + '</title>'
+                + '<link>' + episode_url + '</link>'
+                + '<guid>' + episode_url + '</guid>'
+                + '<description>' + escape('<p>Episode ' + str(index)
+                    + ' of feed ' + str(feed_index) + '.</p>')
+                + '</description>'
+                + '<pubDate>' + formatdate(1400000000 + index * 86400,
+                    usegmt = True) + '</pubDate>'
+                + '<media:content url="' + episode_url + '.mp3" '
+                + 'type="audio/mpeg"/></item>')
+        document = ('<?xml version="1.0"?>'
+            + '<rss version="2.0" xmlns:media="http://search.yahoo.com/mrss/">'
+            + '<channel><title>Feed ' + str(feed_index) + '</title>'
+            + '<description>Generated feed ' + str(feed_index) + '.'
+            + '</description>' + ''.join(items) + '</channel></rss>')
+        return (document.encode('utf-8'), etag)
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """
+    Answers requests for '/feeds/<number>.xml' from the server's catalogue.
+    """
+    def do_GET(self):
+        time.sleep(self.server.catalogue.latency)
+        match = FEED_PATH.match(self.path)
+        document = match and self.server.catalogue.get_document(
+            int(match.group(1)))
+        if not document:
+            self.send_error(404)
+            return
+        body, etag = document
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/rss+xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Keeps requests off the console:
+    def log_message(self, format, *args):
+        pass
+
+#------------------------------------------------------------------------------#
+#     The following functions start and stop the servers of a catalogue.
+#------------------------------------------------------------------------------#
+
+# Starts 'hosts' servers of 'catalogue' on free local ports, each on its own
+# thread, returning the list of servers:
+def start_servers (catalogue, hosts = 1):
+    servers = []
+    for host in range(hosts):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+        server.daemon_threads = True
+        server.catalogue = catalogue
+        threading.Thread(target = server.serve_forever, daemon = True).start()
+        servers.append(server)
+    return servers
+
+# Returns the url of every feed in the catalogue, spread across the servers:
+def get_feed_urls (catalogue, servers):
+    feed_urls = []
+    for feed_index in range(len(catalogue.episode_counts)):
+        host, port = servers[feed_index % len(servers)].server_address[:2]
+        feed_urls.append('http://' + host + ':' + str(port) + '/feeds/'
+            + str(feed_index) + '.xml')
+    return feed_urls
+
+def stop_servers (servers):
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+if __name__ == '__main__':
+    feeds = get_arg(1, 100)
+    episodes = get_arg(2, 20)
+    latency = get_arg(3, 0.0)
+    hosts = get_arg(4, 1)
+    catalogue = FixtureFeeds(feeds, episodes, latency)
+    servers = start_servers(catalogue, hosts)
+    for feed_url in get_feed_urls(catalogue, servers):
+        print (feed_url)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stop_servers(servers)
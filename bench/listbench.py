@@ -0,0 +1,82 @@
+#------------------------------------------------------------------------------#
+#
+#     Copyright 2014 by Konrad R.K. Ludwig.
+#
+#     This file is part of PodBlast.
+#
+#     PodBlast is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#     PodBlast is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#   along with PodBlast. If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------#
+
+import time
+from benchutils import get_arg, quiet
+import gtkinterface
+from gtkinterface import Gtk
+
+#------------------------------------------------------------------------------#
+#     The following script measures the cost of a player state transition
+#   (eg: playing the next episode) on the episode list. It builds the list
+#   without loading the Glade interface, so it runs without a display:
+#
+#       python3 bench/listbench.py [rows] [transitions]
+#------------------------------------------------------------------------------#
+
+# Creates a 'GTKInterface' holding only an episode list of 'rows' episodes:
+def make_interface (rows):
+    ux = gtkinterface.GTKInterface.__new__(gtkinterface.GTKInterface)
+    ux.actv_feed_pkid = 0
+    ux.actv_epsd_pkid = None
+    ux.player_state = 'PLAYING'
+    ux.shown_epsd_pkid = None
+    ux.episode_rows = {}
+    ux.episode_list = Gtk.ListStore(int, bool, str, bool, int, str)
+    for index in range(rows):
+        ux.episode_list.append([index, False, 'Episode ' + str(index), True,
+            700, 'media-playback-start'])
+    return ux
+
+# Updates every row, the way the list was refreshed before rows were
+# tracked by PKID:
+def sweep_episode_list (ux):
+    for episode in ux.episode_list:
+        if episode[0] == ux.actv_epsd_pkid:
+            episode[3] = False
+        ux.refresh_episode_row(episode)
+
+# Returns the average time in seconds taken by 'refresh' for each change of
+# the active episode:
+def time_transitions (ux, refresh, transitions):
+    rows = len(ux.episode_list)
+    with quiet():
+        start = time.perf_counter()
+        for transition in range(transitions):
+            ux.actv_epsd_pkid = (transition * 7919) % rows
+            refresh(ux)
+        elapsed = time.perf_counter() - start
+    return elapsed / transitions
+
+# Marks the active episode as old and refreshes the changed rows, as
+# 'GTKInterface.play()' does:
+def targeted_refresh (ux):
+    ux.mark_old()
+    ux.refresh_episode_list()
+
+if __name__ == '__main__':
+    rows = get_arg(1, 5000)
+    transitions = get_arg(2, 200)
+    for name, refresh in (('Full sweep', sweep_episode_list),
+        ('Targeted', targeted_refresh)):
+        cost = time_transitions(make_interface(rows), refresh, transitions)
+        print (name + ':\t' + str(rows) + ' rows, '
+            + '%.1f' % (cost * 1000000) + ' us per transition')
@@ -0,0 +1,104 @@
+#------------------------------------------------------------------------------#
+#
+#     Copyright 2014 by Konrad R.K. Ludwig.
+#
+#     This file is part of PodBlast.
+#
+#     PodBlast is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#     PodBlast is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#   along with PodBlast. If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------#
+
+import gc
+import sys
+import time
+import tracemalloc
+import benchutils  # Makes the modules in src/ importable.
+import database
+
+#------------------------------------------------------------------------------#
+#     The following script measures the memory used per episode by the
+#   'Episode' layout (slots, epoch seconds and per-feed flag arrays) next to
+#   the layout it replaced (an instance dictionary, a 'time.struct_time', a
+#   list of media urls and two booleans per episode). The episodes' strings
+#   are shared with their sources, so only the layout's own overhead is
+#   counted:
+#
+#       python3 bench/memorybench.py [sizes...]
+#------------------------------------------------------------------------------#
+
+SIZES = (1000, 10000, 100000)
+
+class OldEpisode(object):
+    """
+    The 'Episode' layout used before episodes had slots.
+    """
+    def __init__(self, episode_source):
+        self.guid = episode_source.guid
+        self.url = episode_source.link
+        self.title = episode_source.title
+        self.description = episode_source.description
+        self.dtg_published = time.gmtime(episode_source.published_epoch)
+        self.media = []
+        for media_source in episode_source.media_content:
+            self.media.append(media_source['url'])
+        self.downloaded = episode_source.downloaded
+        self.is_new = episode_source.is_new
+
+# Returns a list of 'count' episode sources:
+def make_sources (count):
+    episode_sources = []
+    for index in range(count):
+        episode_url = 'http://example.com/episode/' + str(index)
+        episode_sources.append(database.LDEpisodeSource({
+            'guid' : episode_url,
+            'url' : episode_url,
+            'title' : 'Episode ' + str(index),
+            'description' : 'Episode ' + str(index) + ' of the podcast.',
+            'dtg_published' : 1400000000 + index * 3600,
+            'media' : [episode_url + '.mp3'],
+            'downloaded' : False,
+            'is_new' : index % 2 == 0
+            }))
+    return episode_sources
+
+# Returns the bytes allocated by 'build()' and still held afterwards:
+def measure (build, episode_sources):
+    gc.collect()
+    tracemalloc.start()
+    built = build(episode_sources)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del built
+    return size
+
+# Builds a feed holding the episodes in the current layout:
+def build_feed (episode_sources):
+    feed = database.Feed(database.LDFeedSource({'url' : 'http://example.com/',
+        'title' : 'Podcast', 'description' : 'A podcast.', 'valid' : True,
+        'episodes' : []}))
+    feed.set_episodes(episode_sources)
+    # The GUID index is the same for both layouts:
+    feed.episode_index = {}
+    return feed
+
+if __name__ == '__main__':
+    sizes = [int(size) for size in sys.argv[1:]] or SIZES
+    for size in sizes:
+        episode_sources = make_sources(size)
+        old_size = measure(lambda episode_sources: [OldEpisode(episode_source)
+            for episode_source in episode_sources], episode_sources)
+        new_size = measure(build_feed, episode_sources)
+        print ('Episodes: ' + str(size) + '\told layout '
+            + '%.0f' % (old_size / size) + ' B/episode, slots '
+            + '%.0f' % (new_size / size) + ' B/episode')
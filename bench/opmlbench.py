@@ -0,0 +1,82 @@
+#------------------------------------------------------------------------------#
+#
+#     Copyright 2014 by Konrad R.K. Ludwig.
+#
+#     This file is part of PodBlast.
+#
+#     PodBlast is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#     PodBlast is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#   along with PodBlast. If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------#
+
+import os
+import time
+import tempfile
+from types import SimpleNamespace
+from benchutils import get_arg, quiet
+import database
+import feedserver
+from opml import write_opml
+
+#------------------------------------------------------------------------------#
+#     The following script writes an 'OPML' file listing generated feeds served
+#   locally (see 'feedserver.py') and measures importing it into an empty
+#   'Database', next to registering a sample of the feeds one at a time:
+#
+#       python3 bench/opmlbench.py [feeds] [latency] [hosts] [sample]
+#------------------------------------------------------------------------------#
+
+# Returns a tuple with the time in seconds taken to import an 'OPML' file and
+# the number of feeds registered:
+def time_import (file_path):
+    with quiet():
+        db = database.Database()
+        start = time.perf_counter()
+        db.import_opml(file_path)
+        elapsed = time.perf_counter() - start
+    return (elapsed, len(db.feeds))
+
+# Returns the time in seconds taken to register each feed in turn:
+def time_registration (feed_urls):
+    with quiet():
+        db = database.Database()
+        start = time.perf_counter()
+        for feed_url in feed_urls:
+            db.register_feed(feed_url)
+        return time.perf_counter() - start
+
+if __name__ == '__main__':
+    feeds = get_arg(1, 500)
+    latency = get_arg(2, 0.2)
+    hosts = get_arg(3, 16)
+    sample = get_arg(4, 25)
+    catalogue = feedserver.FixtureFeeds(feeds, 20, latency)
+    servers = feedserver.start_servers(catalogue, hosts)
+    try:
+        feed_urls = feedserver.get_feed_urls(catalogue, servers)
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'subscriptions.opml')
+            write_opml(file_path, [SimpleNamespace(url = feed_url,
+                title = 'Feed ' + str(feed_index))
+                for feed_index, feed_url in enumerate(feed_urls)])
+            elapsed, imported = time_import(file_path)
+        print ('Import:\t\t' + str(imported) + ' of ' + str(feeds) + ' feeds '
+            + 'on ' + str(hosts) + ' hosts in ' + '%.2f' % elapsed + ' s ('
+            + '%.0f' % (latency * 1000) + ' ms per request)')
+        sample = min(sample, feeds)
+        elapsed = time_registration(feed_urls[:sample])
+        print ('One at a time:\t' + str(sample) + ' feeds in '
+            + '%.2f' % elapsed + ' s (about ' + '%.0f' % (elapsed * feeds
+            / sample) + ' s for ' + str(feeds) + ')')
+    finally:
+        feedserver.stop_servers(servers)
@@ -0,0 +1,69 @@
+#------------------------------------------------------------------------------#
+#
+#     Copyright 2014 by Konrad R.K. Ludwig.
+#
+#     This file is part of PodBlast.
+#
+#     PodBlast is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#     PodBlast is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#   along with PodBlast. If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------#
+
+import os
+import time
+import tempfile
+from benchutils import get_arg
+import positions
+
+#------------------------------------------------------------------------------#
+#     The following script measures the cost of a resume position checkpoint
+#   (one changed position appended to disk) as the number of stored positions
+#   grows, next to the cost of rewriting every position each time:
+#
+#       python3 bench/positionbench.py [checkpoints]
+#------------------------------------------------------------------------------#
+
+SIZES = (1000, 10000, 100000, 1000000)
+
+# Returns a 'PositionStore' of 'size' positions loaded from 'file_path':
+def make_store (file_path, size):
+    store = positions.PositionStore()
+    store.file_path = file_path
+    for index in range(size):
+        store.set('http://example.com/episode/' + str(index) + '.mp3',
+            index % 3600 + 1)
+    store.compact()
+    store.load(file_path)
+    return store
+
+# Returns the average time in seconds taken by 'save' for each checkpoint:
+def time_checkpoints (store, save, checkpoints):
+    start = time.perf_counter()
+    for checkpoint in range(checkpoints):
+        store.set('http://example.com/episode/0.mp3', checkpoint * 10 + 1)
+        save(store)
+    return (time.perf_counter() - start) / checkpoints
+
+if __name__ == '__main__':
+    checkpoints = get_arg(1, 200)
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, 'podblast_db.positions')
+        for size in SIZES:
+            store = make_store(file_path, size)
+            appended = time_checkpoints(store,
+                lambda store: store.flush(file_path), checkpoints)
+            rewritten = time_checkpoints(store,
+                lambda store: store.compact(), max(1, checkpoints // 20))
+            print ('Positions: ' + str(size) + '\tcheckpoint '
+                + '%.1f' % (appended * 1000000) + ' us, rewrite '
+                + '%.1f' % (rewritten * 1000000) + ' us')
@@ -0,0 +1,77 @@
+#------------------------------------------------------------------------------#
+#
+#     Copyright 2014 by Konrad R.K. Ludwig.
+#
+#     This file is part of PodBlast.
+#
+#     PodBlast is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#     PodBlast is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#   along with PodBlast. If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------#
+
+import time
+from benchutils import get_arg, quiet
+import database
+import feedserver
+from fetcher import FeedFetcher
+
+#------------------------------------------------------------------------------#
+#     The following script subscribes a 'Database' to generated feeds served
+#   locally (see 'feedserver.py'), then measures 'refresh_feeds()' when no
+#   feed has changed, when a tenth of the feeds have new episodes, and with a
+#   single fetching thread for comparison:
+#
+#       python3 bench/refreshbench.py [feeds] [latency] [hosts]
+#------------------------------------------------------------------------------#
+
+# Refreshes every feed, returning a tuple with the time in seconds taken and
+# the number of new episodes merged:
+def time_refresh (db):
+    new_episodes = [0]
+
+    def on_progress(completed, total, feed_url, feed_new_episodes):
+        new_episodes[0] += feed_new_episodes
+
+    with quiet():
+        start = time.perf_counter()
+        db.refresh_feeds(on_progress)
+        elapsed = time.perf_counter() - start
+    return (elapsed, new_episodes[0])
+
+# Prints the time and outcome of a refresh:
+def report_refresh (name, db):
+    hits = db.cache_hits
+    elapsed, new_episodes = time_refresh(db)
+    print (name + ':\t' + '%.2f' % elapsed + ' s, '
+        + str(db.cache_hits - hits) + ' not modified, '
+        + str(new_episodes) + ' new episodes')
+
+if __name__ == '__main__':
+    feeds = get_arg(1, 200)
+    latency = get_arg(2, 0.1)
+    hosts = get_arg(3, 8)
+    catalogue = feedserver.FixtureFeeds(feeds, 20, latency)
+    servers = feedserver.start_servers(catalogue, hosts)
+    try:
+        with quiet():
+            db = database.Database()
+            db.import_feeds(feedserver.get_feed_urls(catalogue, servers))
+        print ('Feeds:\t\t' + str(len(db.feeds)) + ' on ' + str(hosts)
+            + ' hosts, ' + '%.0f' % (latency * 1000) + ' ms per request')
+        report_refresh('Unchanged', db)
+        catalogue.publish(range(0, feeds, 10), 2)
+        report_refresh('Tenth changed', db)
+        db.fetcher = FeedFetcher(max_workers = 1)
+        report_refresh('One thread', db)
+    finally:
+        feedserver.stop_servers(servers)
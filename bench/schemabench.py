@@ -0,0 +1,109 @@
+#------------------------------------------------------------------------------#
+#
+#     Copyright 2014 by Konrad R.K. Ludwig.
+#
+#     This file is part of PodBlast.
+#
+#     PodBlast is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#     PodBlast is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#   along with PodBlast. If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------#
+
+import os
+import time
+import tempfile
+from benchutils import get_arg, quiet
+import codec
+import database
+from pbutils import pack_time, epoch_to_time
+
+#------------------------------------------------------------------------------#
+#     The following script writes the same generated catalogue as a version 1
+#   database (published times as 'pbutils.pack_time()' dictionaries) and as a
+#   version 2 database (published times as epoch seconds), then loads each
+#   into a 'Database' with every episode built, printing the time taken and
+#   the size of each file:
+#
+#       python3 bench/schemabench.py [feeds] [episodes per feed]
+#------------------------------------------------------------------------------#
+
+# Returns the feed caches of a catalogue of 'feeds' feeds, each with
+# 'episodes' episodes, with published times stored as 'version' stores them:
+def make_catalogue (feeds, episodes, version):
+    feed_caches = []
+    for feed_index in range(feeds):
+        feed_url = 'http://example.com/' + str(feed_index) + '/feed.xml'
+        episode_caches = []
+        for index in range(episodes):
+            episode_url = feed_url + '#' + str(index)
+            published = 1400000000 + (feed_index * episodes + index) * 3600
+            if version < 2:
+                published = pack_time(epoch_to_time(published))
+            episode_caches.append({
+                'guid' : episode_url,
+                'url' : episode_url,
+                'title' : 'Episode ' + str(index),
+                'description' : 'Episode ' + str(index) + ' of feed '
+                    + str(feed_index) + '.',
+                'media' : [episode_url + '.mp3'],
+                'dtg_published' : published,
+                'downloaded' : False,
+                'is_new' : index < 3
+                })
+        feed_caches.append({
+            'url' : feed_url,
+            'title' : 'Feed ' + str(feed_index),
+            'description' : 'Feed number ' + str(feed_index) + '.',
+            'valid' : True,
+            'episodes' : episode_caches
+            })
+    return feed_caches
+
+# Writes a snapshot with 'version' in its header, laid out as
+# 'storage.write_snapshot()' lays it out:
+def write_snapshot (file_path, version, feed_caches):
+    with open(file_path, 'w') as json_file:
+        json_file.write('{"version": ' + str(version) + ', "seq": 0, '
+            + '"feeds": [\n')
+        json_file.write(',\n'.join([codec.dumps(feed_cache)
+            for feed_cache in feed_caches]))
+        json_file.write('\n]}')
+
+# Returns the time in seconds taken to load 'file_path' into a new 'Database'
+# with every episode built:
+def time_load (file_path):
+    with quiet():
+        db = database.Database()
+        db.lazy_load = False
+        start = time.perf_counter()
+        db.load(file_path)
+        elapsed = time.perf_counter() - start
+    if not db.feeds:
+        raise RuntimeError('Failed to load "' + file_path + '"')
+    return elapsed
+
+if __name__ == '__main__':
+    feeds = get_arg(1, 100)
+    episodes = get_arg(2, 200)
+    with tempfile.TemporaryDirectory() as directory:
+        for version in (1, 2):
+            file_path = os.path.join(directory, 'podblast_db_v' + str(version))
+            feed_caches = make_catalogue(feeds, episodes, version)
+            start = time.perf_counter()
+            write_snapshot(file_path, version, feed_caches)
+            write_time = time.perf_counter() - start
+            load_time = time_load(file_path)
+            print ('Version ' + str(version) + ':\t' + str(feeds * episodes)
+                + ' episodes, write ' + '%.3f' % write_time + ' s, load '
+                + '%.3f' % load_time + ' s, '
+                + '%.1f' % (os.path.getsize(file_path) / 1000000) + ' MB')
@@ -0,0 +1,93 @@
+#------------------------------------------------------------------------------#
+#
+#     Copyright 2014 by Konrad R.K. Ludwig.
+#
+#     This file is part of PodBlast.
+#
+#     PodBlast is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#     PodBlast is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#   along with PodBlast. If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------#
+
+import time
+import random
+from benchutils import get_arg
+import searchindex
+
+#------------------------------------------------------------------------------#
+#     The following script builds a search index over generated episodes
+#   (titles and 'HTML' descriptions drawn from a random vocabulary, plus one
+#   word used by every episode) and measures ranked queries for whole words,
+#   prefixes, several words, the common word and a single feed:
+#
+#       python3 bench/searchbench.py [episodes] [queries]
+#------------------------------------------------------------------------------#
+
+EPISODES_PER_FEED = 500
+VOCABULARY_SIZE = 20000
+COMMON_WORD = 'podcast'
+
+# Returns a list of 'size' random words:
+def make_vocabulary (generator, size):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return [''.join([generator.choice(letters)
+        for letter in range(generator.randint(3, 9))]) for word in range(size)]
+
+# Returns a 'SearchIndex' of 'episodes' generated episodes and the time in
+# seconds taken to build it:
+def build_index (generator, vocabulary, episodes):
+    def make_text (words):
+        return ' '.join([generator.choice(vocabulary) for word in range(words)])
+    documents = []
+    for index in range(episodes):
+        feed_url = ('http://example.com/' + str(index // EPISODES_PER_FEED)
+            + '/feed.xml')
+        documents.append((feed_url, index % EPISODES_PER_FEED, make_text(6),
+            '<p>' + make_text(40) + ' &amp; ' + COMMON_WORD + '</p>'))
+    index = searchindex.SearchIndex()
+    start = time.perf_counter()
+    for feed_url, episode_pkid, title, description in documents:
+        index.add(feed_url, episode_pkid, title, description)
+    return (index, time.perf_counter() - start)
+
+# Returns the average time in seconds taken by a query made by 'make_query()'
+# and the average number of results:
+def time_queries (index, make_query, queries, feed_url = None, limit = 20):
+    results = 0
+    start = time.perf_counter()
+    for query in range(queries):
+        results += len(index.search(make_query(query), feed_url, limit))
+    return ((time.perf_counter() - start) / queries, results / queries)
+
+if __name__ == '__main__':
+    episodes = get_arg(1, 100000)
+    queries = get_arg(2, 200)
+    generator = random.Random(0)
+    vocabulary = make_vocabulary(generator, VOCABULARY_SIZE)
+    index, build_time = build_index(generator, vocabulary, episodes)
+    print ('Build:\t\t' + str(episodes) + ' episodes, '
+        + '%.2f' % build_time + ' s')
+    # Warms the sorted word list used for prefix matching:
+    index.search(vocabulary[0])
+    for name, make_query, feed_url in (
+        ('Word', lambda query: vocabulary[query], None),
+        ('Prefix', lambda query: vocabulary[query][:3], None),
+        ('Two words', lambda query: vocabulary[query] + ' '
+            + vocabulary[query][:2], None),
+        ('Common word', lambda query: COMMON_WORD, None),
+        ('In one feed', lambda query: vocabulary[query][:2],
+            'http://example.com/0/feed.xml')):
+        cost, results = time_queries(index, make_query, queries, feed_url)
+        print (name + ':\t' + ('\t' if len(name) < 8 else '')
+            + '%.2f' % (cost * 1000) + ' ms per query ('
+            + '%.1f' % results + ' results)')
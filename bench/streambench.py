@@ -0,0 +1,119 @@
+#------------------------------------------------------------------------------#
+#
+#     Copyright 2014 by Konrad R.K. Ludwig.
+#
+#     This file is part of PodBlast.
+#
+#     PodBlast is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#     PodBlast is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#   along with PodBlast. If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------#
+
+import sys
+import time
+from benchutils import get_arg, quiet
+import stream
+from stream import Gst
+
+#------------------------------------------------------------------------------#
+#     The following script measures a stream's startup latency (from setting
+#   a uri until the pipeline has prerolled), seek latency (from a flushing
+#   seek until it has prerolled again) and the CPU used per playing stream,
+#   at the normal rate, at 'rate' (through the pitch-preserving tempo filter)
+#   and with silence trimming on. Audio is discarded, so it runs without
+#   sound hardware:
+#
+#       python3 bench/streambench.py <uri> [streams] [seconds] [sink] [rate]
+#------------------------------------------------------------------------------#
+
+# Waits for the stream's pending state change to complete (returning 'False'
+# if it failed):
+def wait_for_preroll (player):
+    result = player.engine.get_state(Gst.CLOCK_TIME_NONE)[0]
+    return result != Gst.StateChangeReturn.FAILURE
+
+# Returns the time in seconds taken to preroll a new stream of 'uri':
+def time_startup (player, uri):
+    player.engine.set_state(Gst.State.READY)
+    start = time.perf_counter()
+    player.set(uri)
+    player.engine.set_state(Gst.State.PAUSED)
+    if not wait_for_preroll(player):
+        raise RuntimeError('Failed to preroll "' + uri + '"')
+    return time.perf_counter() - start
+
+# Returns the average time in seconds taken by a seek to 'seeks' positions
+# spread across the stream. Seeks are sent straight to the pipeline, since
+# there is no main loop to deliver the messages that complete queued seeks:
+def time_seeks (player, seeks, accurate):
+    duration = player.get_duration()
+    start = time.perf_counter()
+    for seek in range(seeks):
+        player.send_seek(duration * ((seek * 7) % seeks) / seeks, accurate)
+        wait_for_preroll(player)
+    return (time.perf_counter() - start) / seeks
+
+# Returns the fraction of a CPU used by each of 'players' over 'seconds' of
+# playback of 'uri' at 'rate':
+def time_playback (players, uri, seconds, rate, trim_silence = False):
+    for player in players:
+        player.set_trim_silence(trim_silence)
+        time_startup(player, uri)
+        player.rate = rate
+        if rate != 1.0:
+            player.send_seek(0, True)
+            wait_for_preroll(player)
+    for player in players:
+        player.engine.set_state(Gst.State.PLAYING)
+    start = time.process_time()
+    time.sleep(seconds)
+    cpu_time = time.process_time() - start
+    for player in players:
+        player.engine.set_state(Gst.State.NULL)
+    return cpu_time / seconds / len(players)
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print ('Usage: python3 bench/streambench.py <uri> [streams] [seconds] '
+            '[sink] [rate]')
+        sys.exit(1)
+    uri = sys.argv[1]
+    streams = get_arg(2, 4)
+    seconds = get_arg(3, 10.0)
+    audio_sink = get_arg(4, 'fake')
+    rate = get_arg(5, 1.5)
+    with quiet():
+        players = [stream.Stream(audio_sink) for index in range(streams)]
+        startups = [time_startup(player, uri) for player in players]
+        for player in players:
+            player.set_trim_silence(True)
+        trim_startups = [time_startup(player, uri) for player in players]
+        for player in players:
+            player.set_trim_silence(False)
+            time_startup(player, uri)
+        accurate_seek = time_seeks(players[0], 20, True)
+        key_unit_seek = time_seeks(players[0], 20, False)
+        cpu = time_playback(players, uri, seconds, 1.0)
+        tempo_cpu = time_playback(players, uri, seconds, rate)
+        trim_cpu = time_playback(players, uri, seconds, 1.0, True)
+        trimmed_time = sum([player.take_trimmed_time() for player in players])
+    print ('Startup:\t' + '%.1f' % (min(startups) * 1000) + ' ms (best), '
+        + '%.1f' % (max(startups) * 1000) + ' ms (worst); trimming silence '
+        + '%.1f' % (min(trim_startups) * 1000) + ' ms (best)')
+    print ('Seek:\t\t' + '%.1f' % (accurate_seek * 1000) + ' ms (accurate), '
+        + '%.1f' % (key_unit_seek * 1000) + ' ms (key unit)')
+    print ('CPU:\t\t' + '%.1f' % (cpu * 100) + '% per stream at 1.0x, '
+        + '%.1f' % (tempo_cpu * 100) + '% at ' + str(rate) + 'x ('
+        + str(streams) + ' streams, ' + audio_sink + ' sink)')
+    print ('Trimming:\t' + '%.1f' % (trim_cpu * 100) + '% CPU per stream, '
+        + '%.1f' % (trimmed_time / streams) + ' s of silence skipped per stream')
@@ -0,0 +1,79 @@
+#------------------------------------------------------------------------------#
+#
+#     Copyright 2014 by Konrad R.K. Ludwig.
+#
+#     This file is part of PodBlast.
+#
+#     PodBlast is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#     PodBlast is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#   along with PodBlast. If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------#
+
+import re
+import time
+import random
+from benchutils import get_arg
+import pbutils
+
+#------------------------------------------------------------------------------#
+#     The following script measures url validation over a list of generated
+#   feed urls (a tenth of them bogus and a tenth duplicated with different
+#   case or ports):
+#
+#       python3 bench/urlbench.py [urls]
+#------------------------------------------------------------------------------#
+
+# Validates a url by compiling the pattern on every call, as 'validate_url()'
+# did before the pattern was compiled once:
+def validate_url_uncached (feed_url):
+    regex_url = re.compile(pbutils.REGEX_URL.pattern, re.IGNORECASE)
+    feed_url = re.match(regex_url, feed_url)
+    if feed_url == None:
+        return feed_url
+    else:
+        return feed_url.group(0)
+
+# Returns a list of 'count' feed urls:
+def make_urls (count):
+    generator = random.Random(0)
+    feed_urls = []
+    for index in range(count):
+        host = 'feeds' + str(generator.randrange(count // 10 + 1)) + '.example.com'
+        feed_url = 'http://' + host + '/podcast/' + str(index) + '.xml'
+        roll = generator.random()
+        if roll < 0.1:
+            feed_url = 'not a url ' + str(index)
+        elif roll < 0.2 and feed_urls:
+            feed_url = feed_urls[-1].replace('http://', 'HTTP://', 1).replace(
+                '.com/', '.com:80/', 1)
+        feed_urls.append(feed_url)
+    return feed_urls
+
+def time_call (function, feed_urls):
+    start = time.perf_counter()
+    result = function(feed_urls)
+    return (time.perf_counter() - start, result)
+
+if __name__ == '__main__':
+    count = get_arg(1, 100000)
+    feed_urls = make_urls(count)
+    for name, function in (
+        ('Compiled per call', lambda urls: [validate_url_uncached(feed_url)
+            for feed_url in urls]),
+        ('Compiled once', lambda urls: [pbutils.validate_url(feed_url)
+            for feed_url in urls]),
+        ('validate_urls()', pbutils.validate_urls)):
+        elapsed, result = time_call(function, feed_urls)
+        valid = len([feed_url for feed_url in result if feed_url])
+        print (name + ':\t' + '%.3f' % elapsed + ' s for ' + str(count)
+            + ' urls (' + str(valid) + ' valid)')
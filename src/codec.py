@@ -0,0 +1,120 @@
+#------------------------------------------------------------------------------#
+#
+#     Copyright 2014 by Konrad R.K. Ludwig.
+#
+#     This file is part of PodBlast.
+#
+#     PodBlast is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#     PodBlast is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#   along with PodBlast. If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------#
+
+import re
+import json
+
+#------------------------------------------------------------------------------#
+#     The following functions encode and decode 'JSON' using the fastest
+#   library installed ('orjson' or 'ujson'), falling back to Python's own
+#   'json' module.
+#------------------------------------------------------------------------------#
+
+try:
+    import orjson
+    CODEC_NAME = 'orjson'
+
+    def dumps(obj):
+        return orjson.dumps(obj).decode('utf-8')
+
+    loads = orjson.loads
+except ImportError:
+    try:
+        import ujson
+        CODEC_NAME = 'ujson'
+        dumps = ujson.dumps
+        loads = ujson.loads
+    except ImportError:
+        CODEC_NAME = 'json'
+        dumps = json.dumps
+        loads = json.loads
+
+#------------------------------------------------------------------------------#
+#     The following functions decode a 'JSON' document one value at a time,
+#   so a large array can be consumed element by element without building the
+#   whole list of decoded objects first. An array written with a line break
+#   after its '[' and each value on a line of its own (as 'dumps()' never
+#   breaks lines) is decoded a line at a time with 'loads()', so the fast
+#   library is used for each value. Other values (eg: from an indented or
+#   older file) are decoded with Python's own decoder.
+#------------------------------------------------------------------------------#
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+DECODER = json.JSONDecoder()
+
+def skip_whitespace (text, index):
+    return WHITESPACE.match(text, index).end()
+
+# Decodes the value starting at 'text[index]', returning a tuple with the
+# value and the index after it. If 'by_line' is set a value filling the rest
+# of its line (up to an optional ',') is decoded with 'loads()':
+def decode_value (text, index, by_line):
+    if by_line:
+        end = text.find('\n', index)
+        if end != -1:
+            line_end = end
+            if text[line_end - 1] == ',':
+                line_end -= 1
+            try:
+                return (loads(text[index:line_end]), line_end)
+            except ValueError:
+                pass
+    return DECODER.raw_decode(text, index)
+
+# Yields each value of the array starting at 'text[index]':
+def iter_array (text, index):
+    if text[index] != '[':
+        raise ValueError('Expected a JSON array at position ' + str(index))
+    by_line = text.startswith('\n', index + 1)
+    index = skip_whitespace(text, index + 1)
+    if text[index] == ']':
+        return
+    while True:
+        value, index = decode_value(text, index, by_line)
+        yield value
+        index = skip_whitespace(text, index)
+        if text[index] == ']':
+            return
+        elif text[index] != ',':
+            raise ValueError('Expected "," or "]" at position ' + str(index))
+        index = skip_whitespace(text, index + 1)
+
+# Decodes the members of the object starting at 'text[index]' up to (but not
+# including) the array named 'array_key', returning a tuple with a dictionary
+# of those members and an iterator over the array's values:
+def iter_object_array (text, index, array_key):
+    if text[index] != '{':
+        raise ValueError('Expected a JSON object at position ' + str(index))
+    members = {}
+    index = skip_whitespace(text, index + 1)
+    while text[index] != '}':
+        key, index = DECODER.raw_decode(text, index)
+        index = skip_whitespace(text, index)
+        if text[index] != ':':
+            raise ValueError('Expected ":" at position ' + str(index))
+        index = skip_whitespace(text, index + 1)
+        if key == array_key:
+            return (members, iter_array(text, index))
+        members[key], index = DECODER.raw_decode(text, index)
+        index = skip_whitespace(text, index)
+        if text[index] == ',':
+            index = skip_whitespace(text, index + 1)
+    return (members, iter([]))
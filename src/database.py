@@ -21,8 +21,22 @@
 
 import feedparser as fdprsr
 fdprsr.PREFERRED_XML_PARSERS.remove('drv_libxml2')  # (FeedParser/Python-3.3 workaround)
-import json
-from pbutils import pack_time, unpack_time
+import os
+import hashlib
+import queue
+import pathlib
+import threading
+from collections import OrderedDict
+from pbutils import (time_to_epoch, epoch_to_time, unpack_epoch, FlagArray,
+    validate_urls, normalize_url)
+from fetcher import FeedFetcher, fetch_url
+from downloader import DownloadManager
+from mediacache import MediaCache
+from opml import read_opml, write_opml
+from positions import PositionStore
+from searchindex import SearchIndex
+from storage import JournalStorage
+from sqlstore import SQLiteStorage, is_sqlite_path
 
 #------------------------------------------------------------------------------#
 #     The following two classes are the core data containers for 'Feed' (aka:
@@ -32,57 +46,245 @@ from pbutils import pack_time, unpack_time
 class Episode(object):
     """
     A data structure containing the important data about a single episode of a
-    podcast (aka: "feed"). It includes a list of urls pointing to each piece
-    of media embeded in the podcast.
+    podcast (aka: "feed"). It includes a tuple of urls pointing to each piece
+    of media embeded in the podcast. To keep large catalogues small, the
+    published date is stored as epoch seconds and the 'is_new'/'downloaded'
+    flags are stored in bit arrays owned by the episode's 'Feed'.
     """
-    def __init__(self, episode_source):
+    __slots__ = ('feed', 'pkid', 'guid', 'url', 'title', 'description',
+        'published', 'media')
+
+    def __init__(self, episode_source, feed, pkid):
+        # Defines the episode's position in its feed:
+        self.feed = feed
+        self.pkid = pkid
         # Defines episode data:
+        self.guid = episode_source.guid
         self.url = episode_source.link
         self.title = episode_source.title
         self.description = episode_source.description
-        self.dtg_published = episode_source.published_parsed
-        # Compiles a list of embeded media urls:
-        self.media = []
-        for media_source in episode_source.media_content:
-            self.media.append(media_source['url'])
-        # Defines episode metadata:
-        self.downloaded = episode_source.downloaded
-        self.is_new = episode_source.is_new
+        self.published = episode_source.published_epoch
+        # Compiles a tuple of embeded media urls:
+        self.media = tuple(media_source['url']
+            for media_source in episode_source.media_content)
+
+    # Episode metadata (stored in the feed's flag arrays):
+
+    @property
+    def is_new(self):
+        return self.feed.new_flags[self.pkid]
+
+    @is_new.setter
+    def is_new(self, value):
+        self.feed.new_flags[self.pkid] = value
+
+    @property
+    def downloaded(self):
+        return self.feed.downloaded_flags[self.pkid]
+
+    @downloaded.setter
+    def downloaded(self, value):
+        self.feed.downloaded_flags[self.pkid] = value
+
+    # The published date as a 9-Tupile time:
+    @property
+    def dtg_published(self):
+        return epoch_to_time(self.published)
+
+    # Returns the stable ID of the episode (its GUID, falling back to its media
+    # url), which unlike its PKID is the same in every copy of the feed:
+    def get_id(self):
+        keys = self.get_keys()
+        if keys:
+            return keys[0]
+
+    # Returns the keys identifying this episode (its GUID and media url):
+    def get_keys(self):
+        return [key for key in (self.guid,) + self.media[:1] if key]
+
+    # Updates the episode data in place from a freshly fetched source, keeping
+    # its metadata (eg: 'is_new'). Returns 'True' if anything changed:
+    def update(self, episode_source):
+        episode_data = (
+            episode_source.guid or self.guid,
+            episode_source.link,
+            episode_source.title,
+            episode_source.description,
+            episode_source.published_epoch,
+            tuple(media_source['url']
+                for media_source in episode_source.media_content)
+            )
+        if episode_data == (self.guid, self.url, self.title,
+            self.description, self.published, self.media):
+            return False
+        (self.guid, self.url, self.title,
+            self.description, self.published, self.media) = episode_data
+        return True
 
     # Generates a JSON string for saving to data to disk:
     def gen_cache(self):
         episode_cache = {
+            'guid' : self.guid,
             'url' : self.url,
             'title' : self.title,
             'description' : self.description,
-            'media' : [],
-            'dtg_published' : pack_time(
-                self.dtg_published
-                ),
+            'media' : list(self.media),
+            'dtg_published' : self.published,
             'downloaded' : self.downloaded,
             'is_new' : self.is_new
         }
-        for media in self.media:
-            episode_cache['media'].append(media)
         return episode_cache
 
 
 class Feed(object):
     """
     A data structure containing the important data about a single podcast
-    (aka: "feed"). It includes a list of 'Episode' objects.
+    (aka: "feed"). It includes a list of 'Episode' objects and the bit arrays
+    holding their 'is_new' and 'downloaded' flags.
     """
+    __slots__ = ('url', 'title', 'description', '_episodes', 'episode_index',
+        'new_flags', 'downloaded_flags', 'episode_caches', 'episode_loader',
+        'episode_count', 'unread_count', 'valid', 'etag', 'modified',
+        'content_hash', 'playback_rate', 'trim_silence')
+
     def __init__(self, feed_source):
         # Extracts feed data:
         self.url = feed_source.url
         self.title = feed_source.title
         self.description = feed_source.description
-        # Compiles a list of episodes:
-        self.episodes = []
-        for episode_source in feed_source.entries:
-            self.episodes.append(Episode(episode_source))
+        # Compiles a list of episodes, unless the source defers loading them
+        # until they are first needed:
+        self._episodes = None
+        self.episode_index = {}
+        self.new_flags = FlagArray()
+        self.downloaded_flags = FlagArray()
+        self.episode_caches = feed_source.episode_caches
+        self.episode_loader = feed_source.episode_loader
+        self.episode_count = feed_source.episode_count
+        self.unread_count = feed_source.unread_count
+        if feed_source.entries != None:
+            self.set_episodes(feed_source.entries)
         # Extracts feed metadata:
         self.valid = feed_source.valid
+        # Extracts HTTP cache validators:
+        self.etag = feed_source.etag
+        self.modified = feed_source.modified
+        self.content_hash = feed_source.content_hash
+        # Extracts listening settings:
+        self.playback_rate = feed_source.playback_rate
+        self.trim_silence = feed_source.trim_silence
+
+    # The episode list, loaded on first access if the feed was loaded without it:
+    @property
+    def episodes(self):
+        if self._episodes == None:
+            print ('Feed:\t\tLoading episodes for: ' + self.url)
+            self.set_episodes([LDEpisodeSource(episode_cache)
+                for episode_cache in self.episode_loader(self)])
+        return self._episodes
+
+    # Returns 'True' if the episode list is currently in memory:
+    def is_loaded(self):
+        return self._episodes != None
+
+    # Drops the episode list from memory. Unless it can be reloaded from
+    # storage, a raw cache of the episode data is kept instead:
+    def unload(self, keep_cache = True):
+        if self._episodes != None:
+            print ('Feed:\t\tUnloading episodes for: ' + self.url)
+            self.episode_count = self.get_episode_count()
+            self.unread_count = self.get_unread_count()
+            if keep_cache:
+                self.episode_caches = [episode.gen_cache()
+                    for episode in self._episodes]
+            self._episodes = None
+            self.episode_index = {}
+            self.new_flags = FlagArray()
+            self.downloaded_flags = FlagArray()
+
+    # Returns the number of episodes without loading them:
+    def get_episode_count(self):
+        if self._episodes != None:
+            return len(self._episodes)
+        elif self.episode_caches != None:
+            return len(self.episode_caches)
+        return self.episode_count
+
+    # Returns the number of new episodes without loading them:
+    def get_unread_count(self):
+        if self._episodes != None:
+            return self.new_flags.count()
+        elif self.episode_caches != None:
+            return len([episode_cache for episode_cache in self.episode_caches
+                if episode_cache['is_new']])
+        return self.unread_count
+
+    # Replaces the episode list with new episodes and indexes them by GUID and
+    # media url:
+    def set_episodes(self, episode_sources):
+        self._episodes = []
+        self.episode_index = {}
+        self.new_flags = FlagArray()
+        self.downloaded_flags = FlagArray()
+        for episode_source in episode_sources:
+            self.append_episode(episode_source)
+
+    # Appends a new episode to the end of the list (so existing PKIDs never
+    # move) and indexes it:
+    def append_episode(self, episode_source):
+        episode_pkid = len(self._episodes)
+        self.new_flags.append(episode_source.is_new)
+        self.downloaded_flags.append(episode_source.downloaded)
+        self._episodes.append(Episode(episode_source, self, episode_pkid))
+        self.index_episode(episode_pkid)
+
+    # Adds an episode's keys to the episode index:
+    def index_episode(self, episode_pkid):
+        for key in self.episodes[episode_pkid].get_keys():
+            self.episode_index[key] = episode_pkid
+
+    # Returns the episode with a GUID or media url, or 'None':
+    def get_episode(self, episode_id):
+        episodes = self.episodes
+        episode_pkid = self.episode_index.get(episode_id)
+        if episode_pkid != None:
+            return episodes[episode_pkid]
+
+    # Finds the PKID of an existing episode matching an episode source by its
+    # GUID, falling back to its media url (or 'None' if it is unknown):
+    def find_episode(self, episode_source):
+        keys = [episode_source.guid]
+        keys += [media_source['url']
+            for media_source in episode_source.media_content[:1]]
+        for key in keys:
+            if key in self.episode_index:
+                return self.episode_index[key]
+        return None
+
+    # Merges a freshly fetched source into the feed, appending unseen episodes
+    # and updating changed ones in place. Returns a tuple of lists with the
+    # PKIDs of new and updated episodes:
+    def merge(self, feed_source):
+        self.etag = feed_source.etag
+        self.modified = feed_source.modified
+        self.content_hash = feed_source.content_hash
+        new_pkids = []
+        updated_pkids = []
+        if feed_source.not_modified:
+            return (new_pkids, updated_pkids)
+        self.title = feed_source.title
+        self.description = feed_source.description
+        self.valid = feed_source.valid
+        episodes = self.episodes
+        for episode_source in feed_source.entries:
+            episode_pkid = self.find_episode(episode_source)
+            if episode_pkid == None:
+                self.append_episode(episode_source)
+                new_pkids.append(len(self.episodes) - 1)
+            elif episodes[episode_pkid].update(episode_source):
+                self.index_episode(episode_pkid)
+                updated_pkids.append(episode_pkid)
+        return (new_pkids, updated_pkids)
 
     # Generates a JSON string for saving to data to disk:
     def gen_cache(self):
@@ -92,7 +294,16 @@ class Feed(object):
             'description' : self.description,
             'episodes': [],
             'valid' : self.valid,
+            'etag' : self.etag,
+            'modified' : self.modified,
+            'content_hash' : self.content_hash,
+            'playback_rate' : self.playback_rate,
+            'trim_silence' : self.trim_silence
             }
+        # Reuses the raw cache of an unloaded feed rather than loading it:
+        if self._episodes == None and self.episode_caches != None:
+            feed_cache['episodes'] = list(self.episode_caches)
+            return feed_cache
         for episode in self.episodes:
             episode_cache = episode.gen_cache()
             feed_cache['episodes'].append(episode_cache)
@@ -111,12 +322,13 @@ class LDEpisodeSource(object):
     (Used to workaround Python's single constructor limitation.)
     """
     def __init__(self, source):
-        # Loads episode data:
+        # Loads episode data (older databases have no GUIDs):
+        self.guid = source.get('guid')
         self.link = source['url']
         self.title = source['title']
         self.description = source['description']
-        self.published_parsed = source['dtg_published']
-        self.media_content = []
+        self.published_epoch = unpack_epoch(source['dtg_published'])
+        self.media_content = [{'url' : media} for media in source['media']]
         # Loads episode metadata:
         self.downloaded = source['downloaded']
         self.is_new = source['is_new']
@@ -125,34 +337,88 @@ class LDEpisodeSource(object):
 class LDFeedSource(object):
     """
     Translates data loaded from the program's 'JSON' formatted database so it
-    can be passed to the 'Feed' class in a uniform matter.
+    can be passed to the 'Feed' class in a uniform matter. If 'lazy' is set
+    or the source has no episode list, the episodes are not built until
+    'episode_loader(feed)' is called to fetch their data.
     (Used to workaround Python's single constructor limitation.)
     """
-    def __init__(self, source):
+    def __init__(self, source, episode_loader = None, lazy = False):
         # Loads feed data:
         self.url = source['url']
         self.title = source['title']
         self.description = source['description']
-        self.entries = []
+        self.entries = None
+        self.episode_caches = None
+        if 'episodes' in source:
+            if lazy:
+                self.episode_caches = source['episodes']
+            else:
+                self.entries = [LDEpisodeSource(episode)
+                    for episode in source['episodes']]
+        self.episode_loader = episode_loader
+        # Loads episode counts (used until episodes are loaded):
+        self.episode_count = source.get('episode_count', 0)
+        self.unread_count = source.get('unread_count', 0)
         # Loads feed metadata:
         self.valid = source['valid']
+        # Loads HTTP cache validators (missing from older databases):
+        self.etag = source.get('etag')
+        self.modified = source.get('modified')
+        self.content_hash = source.get('content_hash')
+        # Loads listening settings (missing from older databases):
+        self.playback_rate = source.get('playback_rate', 1.0)
+        self.trim_silence = source.get('trim_silence', False)
 
 
 class FHFeedSource(object):
     """
     Fetches and parses data for a given feed from a remote loation using
-    'feedparser' and maintains relevant data for the 'Feed' constructor.
+    'feedparser' and maintains relevant data for the 'Feed' constructor. If
+    cache validators from a previous fetch are given and the feed has not
+    changed, parsing is skipped and 'not_modified' is set.
     (Used to workaround Python's single constructor limitation.)
     """
-    def __init__(self, feed_url):
+    def __init__(self, feed_url, etag = None, modified = None,
+        content_hash = None, timeout = 30):
+        self.etag = etag
+        self.modified = modified
+        self.content_hash = content_hash
+        self.playback_rate = 1.0
+        self.trim_silence = False
+        self.not_modified = False
+        self.episode_caches = None
+        self.episode_loader = None
+        self.episode_count = 0
+        self.unread_count = 0
         # Tries to parse the podcast feed, prints error if it fails:
         try:
             self.url = feed_url
-            source = fdprsr.parse(feed_url)
+            response = fetch_url(feed_url, etag, modified, timeout)
+            if response.status == 304:
+                self.not_modified = True
+            else:
+                self.etag = response.etag
+                self.modified = response.modified
+                body_hash = hashlib.sha1(response.body).hexdigest()
+                self.not_modified = body_hash == content_hash
+                self.content_hash = body_hash
+            if self.not_modified:
+                self.valid = True
+                return
+            source = fdprsr.parse(
+                response.body,
+                response_headers = {
+                    'content-location' : feed_url,
+                    'content-type' : response.content_type or ''
+                    }
+                )
             self.title = source.feed.title
             self.description = source.feed.description
             self.entries = source.entries
             for entry in self.entries:
+                entry.guid = entry.get('id')
+                entry.published_epoch = time_to_epoch(
+                    entry.get('published_parsed'))
                 entry.downloaded = False
                 entry.is_new = True
             self.entries.reverse()
@@ -162,6 +428,25 @@ class FHFeedSource(object):
             self.url = feed_url
             self.valid = False
 
+#------------------------------------------------------------------------------#
+#     The following class tracks a feed being fetched in the background by
+#   'Database.register_feed_background()'.
+#------------------------------------------------------------------------------#
+
+class FeedRegistration(object):
+    """
+    A feed registration in progress. Calling 'cancel()' before the feed has
+    been fetched discards it instead of adding it to the database.
+    """
+    def __init__(self, feed_url):
+        self.feed_url = feed_url
+        self.cancelled = False
+        self.thread = None
+
+    def cancel(self):
+        print ('Database:\tCancelled registering feed: ' + self.feed_url)
+        self.cancelled = True
+
 #------------------------------------------------------------------------------#
 #     The following class handles all PodBlast's data, including feed
 #   registrations and subscriptions, as well as saving and loading data to
@@ -176,90 +461,418 @@ class Database(object):
     def __init__(self):
         print ("Initializing Database...")
 
-        # Defines registered feed list:
+        # Defines registered feed list and its index by url:
         self.feeds = []
+        self.feed_index = {}
         self.default_file_path = 'data/podblast_db'
         self.file_path = self.default_file_path
 
-    # Loads data from a 'JSON' formatted database file and reconstructs that
-    # data into 'Feed' and 'Episode' objects:
+        # Instantiates the storage backend which persists changes:
+        self.storage = JournalStorage()
+
+        # Defines lazy loading, where only feed headers are loaded up front and
+        # at most 'max_loaded_feeds' episode lists are kept in memory:
+        self.lazy_load = True
+        self.max_loaded_feeds = 16
+        self.loaded_feeds = OrderedDict()
+
+        # Instantiates the worker pools used to refresh feeds and download
+        # episodes:
+        self.fetcher = FeedFetcher()
+        # Bulk imports are mostly spent waiting on new servers, so they use a
+        # larger pool (still limited per host):
+        self.import_workers = 32
+        self.downloader = DownloadManager()
+        # Holds downloads completed without a 'dispatch' function until
+        # 'run_completions()' handles them on the database's own thread:
+        self.completions = queue.Queue()
+        # Defines the index used to hold downloads under a byte quota:
+        self.media_cache = MediaCache()
+        # Defines the positions episodes were left at, which are checkpointed
+        # on their own rather than with the rest of the database:
+        self.resume_positions = PositionStore()
+        # Defines the full-text episode index (built by the first search or a
+        # feed at a time after 'start_search_index()', then kept up to date as
+        # episodes change) and the urls of the feeds it has yet to index:
+        self.search_index = None
+        self.unindexed_feeds = []
+        # Counts refreshes answered from the HTTP cache ('hits') or by
+        # downloading and parsing the whole feed ('misses'):
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    # Loads data from a 'JSON' formatted database file (replaying any changes
+    # journaled since it was written) and reconstructs that data into 'Feed'
+    # and 'Episode' objects:
     def load(self, file_path = None):
         print ('Database:\tload() called.')
         if not file_path:
             file_path = 'data/podblast_db'
         print ("Database:\tLoading data from: " + file_path)
+        # Reads the file with a new backend, which only replaces the current one
+        # once the file has loaded (so a file which fails to load leaves the
+        # current file, its unsaved changes and the episodes of unopened feeds
+        # untouched):
+        storage_class = self.get_storage_class(file_path)
+        if type(self.storage) is storage_class:
+            storage = self.storage.new_instance()
+        else:
+            storage = storage_class()
+        self.storage.wait()
         loaded = False
         try:
-            # Open 'JSON' database and load data:
-            with open(file_path, 'r') as json_file:
-                data_cache = json.load(json_file)
+            # Reconstruct objects as each feed is decoded:
+            feeds = []
+            feed_index = {}
+            for feed in storage.load(file_path):
+                if feed['url'] in feed_index:
+                    print ('Database:\tSkipping duplicate feed: ' + feed['url'])
+                    continue
+                feed_source = LDFeedSource(
+                    feed, self.load_feed_episodes, self.lazy_load)
+                feeds.append(Feed(feed_source))
+                feed_index[feed['url']] = feeds[-1]
             loaded = True
         except:
             print ("Database:\tFailed to read database.")
+            # Closes the new backend's file (eg: an 'SQLite' connection):
+            storage.reset()
 
         if loaded:
-            # Clear current list:
-            self.feeds = []
-            # Reconstruct objects:
-            for feed in data_cache:
-                feed_source = LDFeedSource(feed)
-                for episode in feed['episodes']:
-                    episode['dtg_published'] = unpack_time(
-                        episode['dtg_published']
-                        )
-                    episode_source = LDEpisodeSource(episode)
-                    for media in episode['media']:
-                        episode_source.media_content.append({'url' : media})
-                    feed_source.entries.append(episode_source)
-                self.feeds.append(Feed(feed_source))
-
-    # Compiles feed, episode and media data into a monolythic 'JSON' compatible
-    # dictionary so it can be saved to disk;
+            self.storage.reset()
+            self.storage = storage
+            # Replace current list:
+            self.feeds = feeds
+            self.feed_index = feed_index
+            self.loaded_feeds = OrderedDict()
+            self.search_index = None
+            self.unindexed_feeds = []
+            self.media_cache.load(self.get_media_index_path(file_path))
+            self.resume_positions.load(self.get_positions_path(file_path))
+
+    # Saves changes to disk. With the default journaled storage this appends
+    # only the changes made since the last save:
     def save(self, file_path = None):
         print ('Database:\tsave() called.')
         if not file_path:
             file_path = 'data/podblast_db'
         print ("Database:\tSaving data to: " + file_path)
-        if self.feeds:
-            # Compile a cache of data:
-            data_cache = []
-            for feed in self.feeds:
-                if feed.valid:
-                    feed_cache = feed.gen_cache()
-                    data_cache.append(feed_cache)
-            # Try to open 'JSON' database and save the cache to disk:
+        self.run_completions()
+        self.select_storage(file_path)
+        try:
+            new_file = file_path != self.storage.file_path
+            self.storage.save(self, file_path)
+            self.media_cache.save(
+                self.get_media_index_path(file_path), new_file)
+            self.resume_positions.flush(self.get_positions_path(file_path))
+        except:
+            print ("Database:\tFailed to write database.")
+
+    # Appends changed resume positions to the file beside the database they
+    # were loaded with or last saved to (without saving anything else):
+    def save_positions(self):
+        if self.resume_positions.file_path:
             try:
-                with open(file_path, 'w') as json_file:
-                    json.dump(data_cache, json_file)
+                self.resume_positions.flush(self.resume_positions.file_path)
             except:
-                print ("Database:\tFailed to write database.")
+                print ("Database:\tFailed to write resume positions.")
+
+    # Returns the path of the downloaded media index saved beside a database:
+    def get_media_index_path(self, file_path):
+        return file_path + '.media'
+
+    # Returns the path of the resume positions saved beside a database:
+    def get_positions_path(self, file_path):
+        return file_path + '.positions'
+
+    # Returns the storage backend suited to a database file ('SQLite' for
+    # '.sqlite' or '.db' files, otherwise a journaled 'JSON' file):
+    def get_storage_class(self, file_path):
+        if is_sqlite_path(file_path):
+            return SQLiteStorage
+        return JournalStorage
 
+    # Switches to the storage backend suited to a database file:
+    def select_storage(self, file_path):
+        storage_class = self.get_storage_class(file_path)
+        if type(self.storage) is not storage_class:
+            self.detach_storage()
+            self.storage = storage_class()
+
+    # Copies the episodes of feeds which have not been opened out of the
+    # current backend before it is replaced, since they would otherwise be
+    # read from the new one (which does not have them):
+    def detach_storage(self):
+        if self.storage.reloads_episodes:
+            for feed in self.feeds:
+                if not feed.is_loaded() and feed.episode_caches == None:
+                    feed.episode_caches = self.storage.load_episodes(feed.url)
+        self.storage.reset()
+
+    # Clears every feed and detaches the database from its file:
+    def clear(self):
+        self.feeds = []
+        self.feed_index = {}
+        self.loaded_feeds = OrderedDict()
+        self.media_cache = MediaCache(self.media_cache.quota)
+        self.resume_positions = PositionStore()
+        self.search_index = None
+        self.unindexed_feeds = []
+        self.storage.reset()
+
+    #---------------- ----- --- --- - - - -  -     -
+    # Lazy episode loading:
+
+    # Returns the episode data for a feed the first time its episodes are
+    # needed (called by 'Feed.episodes'):
+    def load_feed_episodes(self, feed):
+        if feed.episode_caches != None:
+            episode_caches = feed.episode_caches
+            feed.episode_caches = None
         else:
-            print ("Database:\tNo feeds to save.")
+            episode_caches = self.storage.load_episodes(feed.url)
+        self.touch_feed(feed)
+        return episode_caches
+
+    # Marks a feed as recently used and unloads the episodes of the least
+    # recently used feeds beyond 'max_loaded_feeds':
+    def touch_feed(self, feed):
+        self.loaded_feeds[feed.url] = feed
+        self.loaded_feeds.move_to_end(feed.url)
+        for feed_url, lru_feed in list(self.loaded_feeds.items()):
+            if len(self.loaded_feeds) <= self.max_loaded_feeds:
+                break
+            if lru_feed is not feed and not self.is_feed_active(lru_feed):
+                del self.loaded_feeds[feed_url]
+                lru_feed.unload(not self.storage.reloads_episodes)
+
+    # Returns 'True' if a feed is in use and must not be unloaded (overridden
+    # by 'PodBlast' to protect the active feed):
+    def is_feed_active(self, feed):
+        return False
 
     # Registers a new feed with PodBlast if it has not already been registered,
     # returns boolean "success" report:
     def register_feed(self, feed_url):
         print ('register_feed() called.')
-        search_results = [search for search in self.feeds if search.url == feed_url]
-        if search_results:
+        if feed_url in self.feed_index:
             print ("Database:\tFeed already registered: " + feed_url)
             return False
         else:
             try:
-                source = FHFeedSource(feed_url)
-                self.feeds.append(
-                    Feed(source)
-                    )
+                self.add_feed(FHFeedSource(feed_url))
                 return True
             except:
                 print ("Database:\tFailed to register feed: " + feed_url)
                 return False
 
+    # Registers a new feed without blocking, fetching it on a background
+    # thread. 'callback' is called with the feed url and a "success" report
+    # once the feed has been added (or has failed, timed out after 'timeout'
+    # seconds or been cancelled). If a 'dispatch' function is given (eg:
+    # 'GObject.idle_add'), the feed is added on the caller's main loop.
+    # Returns a 'FeedRegistration', or 'None' if the feed is registered:
+    def register_feed_background(self, feed_url, callback = None,
+        dispatch = None, timeout = 30):
+        if feed_url in self.feed_index:
+            print ("Database:\tFeed already registered: " + feed_url)
+            return None
+        registration = FeedRegistration(feed_url)
+
+        def add(source):
+            success = False
+            if (not registration.cancelled and source.valid
+                and feed_url not in self.feed_index):
+                try:
+                    self.add_feed(source)
+                    success = True
+                except:
+                    pass
+            if not success and not registration.cancelled:
+                print ("Database:\tFailed to register feed: " + feed_url)
+            if callback:
+                callback(feed_url, success)
+
+        def fetch():
+            source = FHFeedSource(feed_url, timeout = timeout)
+            if dispatch:
+                dispatch(add, source)
+            else:
+                add(source)
+
+        registration.thread = threading.Thread(target = fetch)
+        registration.thread.daemon = True
+        registration.thread.start()
+        return registration
+
+    # Adds a feed built from a fetched source to the database:
+    def add_feed(self, feed_source):
+        feed = Feed(feed_source)
+        # Fetched feeds reload their episodes from storage once unloaded:
+        feed.episode_loader = self.load_feed_episodes
+        self.feeds.append(feed)
+        self.feed_index[feed.url] = feed
+        self.storage.record_register(feed)
+        self.index_episodes(feed, range(len(feed.episodes)))
+        self.touch_feed(feed)
+        return feed
+
+    #---------------- ----- --- --- - - - -  -     -
+    # Bulk subscription import and export:
+
+    # Returns the valid urls from a list which are not registered yet, in
+    # order and normalized without duplicates:
+    def filter_new_feed_urls(self, feed_urls):
+        registered = set(self.feed_index)
+        registered.update(normalize_url(feed_url) for feed_url in self.feed_index)
+        return [feed_url for feed_url in validate_urls(feed_urls)
+            if feed_url not in registered]
+
+    # Returns the new feed urls listed in an 'OPML' file:
+    def read_opml_feed_urls(self, file_path):
+        return self.filter_new_feed_urls(read_opml(file_path))
+
+    # Registers many feeds at once, fetching and parsing them in parallel.
+    # Urls which are bogus or already registered are skipped. As each feed
+    # completes, 'progress_callback' is called with the number of feeds
+    # completed, the total, the feed url and a "success" report. 'dispatch'
+    # works as in 'refresh_feeds()'. Returns the number of feeds fetched:
+    def import_feeds(self, feed_urls, progress_callback = None, dispatch = None):
+        print ('Database:\timport_feeds() called.')
+        feed_urls = self.filter_new_feed_urls(feed_urls)
+        total = len(feed_urls)
+        completed = [0]
+
+        def add(feed_url, source):
+            completed[0] += 1
+            success = False
+            if source and source.valid and feed_url not in self.feed_index:
+                try:
+                    self.add_feed(source)
+                    success = True
+                except:
+                    pass
+            if not success:
+                print ("Database:\tFailed to import feed: " + feed_url)
+            if progress_callback:
+                progress_callback(completed[0], total, feed_url, success)
+
+        def on_fetched(feed_url, source):
+            if dispatch:
+                dispatch(add, feed_url, source)
+            else:
+                add(feed_url, source)
+
+        self.fetcher.fetch_all(feed_urls, FHFeedSource, on_fetched,
+            self.import_workers)
+        return total
+
+    # Registers the feeds listed in an 'OPML' file (see 'import_feeds()'):
+    def import_opml(self, file_path, progress_callback = None, dispatch = None):
+        print ("Database:\tImporting feeds from: " + file_path)
+        return self.import_feeds(read_opml(file_path), progress_callback,
+            dispatch)
+
+    # Writes every valid feed to an 'OPML' file, returns boolean "success"
+    # report:
+    def export_opml(self, file_path):
+        print ("Database:\tExporting feeds to: " + file_path)
+        try:
+            write_opml(file_path, (feed for feed in self.feeds if feed.valid))
+            return True
+        except:
+            print ("Database:\tFailed to export feeds.")
+            return False
+
+    # Fetches every registered feed in parallel and merges new episodes into the
+    # existing feeds. As each feed completes, 'progress_callback' is called with
+    # the number of feeds completed, the total, the feed url and the number of
+    # new episodes. If a 'dispatch' function is given (eg: 'GObject.idle_add'),
+    # merges and progress reports are handed to it so they run on the caller's
+    # main loop instead of the refreshing thread:
+    def refresh_feeds(self, progress_callback = None, dispatch = None):
+        print ('Database:\trefresh_feeds() called.')
+        validators = {}
+        for feed in self.feeds:
+            validators[feed.url] = (feed.etag, feed.modified, feed.content_hash)
+        total = len(validators)
+        completed = [0]
+
+        def fetch(feed_url):
+            return FHFeedSource(feed_url, *validators[feed_url])
+
+        def merge(feed_url, source):
+            completed[0] += 1
+            new_episodes = 0
+            if source and source.valid:
+                if source.not_modified:
+                    self.cache_hits += 1
+                else:
+                    self.cache_misses += 1
+                feed = self.feed_index.get(feed_url)
+                if feed:
+                    validators = (feed.etag, feed.modified, feed.content_hash)
+                    new_pkids, updated_pkids = feed.merge(source)
+                    new_episodes += len(new_pkids)
+                    if (not source.not_modified or validators !=
+                        (feed.etag, feed.modified, feed.content_hash)):
+                        self.storage.record_feed(feed)
+                    self.storage.record_episodes(feed, updated_pkids + new_pkids)
+                    self.index_episodes(feed, updated_pkids + new_pkids)
+            else:
+                print ("Database:\tFailed to refresh feed: " + feed_url)
+            if progress_callback:
+                progress_callback(completed[0], total, feed_url, new_episodes)
+
+        def on_fetched(feed_url, source):
+            if dispatch:
+                dispatch(merge, feed_url, source)
+            else:
+                merge(feed_url, source)
+
+        self.fetcher.fetch_all(validators.keys(), fetch, on_fetched)
+
+    # Returns the feed refresh cache counters:
+    def get_cache_stats(self):
+        return {
+            'hits' : self.cache_hits,
+            'misses' : self.cache_misses
+            }
+
     # Deletes a feed from PodBlast's database, returns boolean "success" report:
     def delete_feed(self, feed_url):
-        for feed in [search for search in self.feeds if search.url == feed_url]:
+        feed = self.feed_index.pop(feed_url, None)
+        if feed:
             self.feeds.remove(feed)
+            self.loaded_feeds.pop(feed_url, None)
+            self.storage.record_delete(feed_url)
+            if self.search_index:
+                self.search_index.remove_feed(feed_url)
+        # Deletes the feed's downloads:
+        for media_url, entry in list(self.media_cache.entries.items()):
+            if entry[0] == feed_url:
+                self.media_cache.remove(media_url)
+                self.remove_media_file(media_url)
+
+    # Stable ID accessors (PKIDs change as feeds are deleted, urls and episode
+    # IDs do not):
+
+    # Returns the feed registered with a url, or 'None':
+    def get_feed(self, feed_url):
+        return self.feed_index.get(feed_url)
+
+    # Returns the current PKID of a feed, or 'None':
+    def get_feed_pkid(self, feed_url):
+        feed = self.feed_index.get(feed_url)
+        if feed:
+            return self.feeds.index(feed)
+
+    # Returns an episode by its feed url and episode ID (see 'Episode.get_id()'),
+    # or 'None':
+    def get_episode(self, feed_url, episode_id):
+        feed = self.feed_index.get(feed_url)
+        if feed:
+            return feed.get_episode(episode_id)
 
     # Checks if an episode is new:
     def check_new(self, feed_pkid, episode_pkid):
@@ -269,4 +882,176 @@ class Database(object):
     # Marks an episode as old:
     def mark_old(self, feed_pkid, episode_pkid):
         print ('Database:\tMarking feed #' + str(feed_pkid) + ', episode #' + str(episode_pkid) + ' as "old".')
-        self.feeds[feed_pkid].episodes[episode_pkid].is_new = False
\ No newline at end of file
+        feed = self.feeds[feed_pkid]
+        feed.episodes[episode_pkid].is_new = False
+        self.storage.record_mark_old(feed.url, episode_pkid)
+
+    # Sets the playback rate remembered for a feed:
+    def set_feed_rate(self, feed, playback_rate):
+        if feed.playback_rate != playback_rate:
+            feed.playback_rate = playback_rate
+            self.storage.record_feed(feed)
+
+    # Sets whether silence is trimmed from a feed's episodes:
+    def set_feed_trim_silence(self, feed, trim_silence):
+        if feed.trim_silence != trim_silence:
+            feed.trim_silence = trim_silence
+            self.storage.record_feed(feed)
+
+    # Sets whether an episode has a local copy of its media:
+    def set_downloaded(self, feed, episode_pkid, downloaded):
+        feed.episodes[episode_pkid].downloaded = downloaded
+        self.storage.record_episodes(feed, [episode_pkid])
+
+    #---------------- ----- --- --- - - - -  -     -
+    # Episode search:
+
+    # Returns '(feed, episode_pkid)' pairs for the episodes whose titles and
+    # descriptions contain every word of 'query' (the last letters of a word
+    # may be left off), best match first. 'feed_url' limits the search to one
+    # feed and 'limit' caps the number of results:
+    def search(self, query, feed_url = None, limit = None):
+        if self.search_index == None or self.unindexed_feeds:
+            self.build_search_index()
+        return [(self.feed_index[result_url], episode_pkid)
+            for result_url, episode_pkid
+            in self.search_index.search(query, feed_url, limit)
+            if result_url in self.feed_index]
+
+    # Indexes every episode not indexed yet (see 'start_search_index()'):
+    def build_search_index(self):
+        if self.search_index == None:
+            self.start_search_index()
+        while self.index_next_feed():
+            pass
+
+    # Starts a new, empty search index which 'index_next_feed()' fills a feed
+    # at a time, so it can be built while a main loop is idle (eg: with
+    # 'GObject.idle_add(db.index_next_feed)'):
+    def start_search_index(self):
+        print ('Database:\tBuilding search index.')
+        self.search_index = SearchIndex()
+        self.unindexed_feeds = [feed.url for feed in reversed(self.feeds)]
+
+    # Indexes the episodes of the next feed not indexed yet, reading unloaded
+    # feeds from their raw caches (or storage) rather than loading them.
+    # Returns 'True' while feeds remain:
+    def index_next_feed(self):
+        if self.search_index == None:
+            return False
+        while self.unindexed_feeds:
+            feed = self.feed_index.get(self.unindexed_feeds.pop())
+            if feed == None:
+                continue
+            if feed.is_loaded():
+                self.index_episodes(feed, range(len(feed.episodes)))
+                break
+            episode_caches = feed.episode_caches
+            if episode_caches == None:
+                episode_caches = self.storage.load_episodes(feed.url)
+            for episode_pkid, episode_cache in enumerate(episode_caches):
+                self.search_index.add(feed.url, episode_pkid,
+                    episode_cache['title'], episode_cache['description'])
+            break
+        if self.unindexed_feeds:
+            return True
+        # Sorts the words for prefix matching ahead of the first search:
+        self.search_index.sort_words()
+        return False
+
+    # Adds new or changed episodes to the search index (if it has been built):
+    def index_episodes(self, feed, episode_pkids):
+        if self.search_index != None:
+            for episode_pkid in episode_pkids:
+                episode = feed.episodes[episode_pkid]
+                self.search_index.add(feed.url, episode_pkid,
+                    episode.title, episode.description)
+
+    #---------------- ----- --- --- - - - -  -     -
+    # Episode downloads:
+
+    # Downloads an episode's media to the local cache in the background and
+    # marks it as downloaded once complete. 'callback' is called with the feed
+    # url, episode PKID and a "success" report. If a 'dispatch' function is
+    # given (eg: 'GObject.idle_add'), completion is handled on the caller's
+    # main loop. Otherwise it waits for the next 'run_completions()' (storage
+    # may only be used from the thread which opened it). Returns 'False' if
+    # the download could not be started:
+    def download_episode(self, feed_pkid, episode_pkid, callback = None,
+        dispatch = None):
+        self.run_completions()
+        feed_url = self.feeds[feed_pkid].url
+        episode = self.feeds[feed_pkid].episodes[episode_pkid]
+        if not episode.media:
+            print ('Database:\tEpisode has no media to download.')
+            return False
+
+        media_url = episode.media[0]
+
+        def on_complete(success):
+            if success:
+                feed = self.feed_index.get(feed_url)
+                if feed:
+                    self.set_downloaded(feed, episode_pkid, True)
+                    self.media_cache.add(media_url, feed_url, episode_pkid,
+                        os.path.getsize(self.downloader.get_path(media_url)))
+                self.enforce_media_quota([media_url])
+            if callback:
+                callback(feed_url, episode_pkid, success)
+
+        def on_transfer(media_url, success):
+            if dispatch:
+                dispatch(on_complete, success)
+            else:
+                self.completions.put((on_complete, success))
+
+        return self.downloader.download(media_url, on_transfer)
+
+    # Handles the downloads completed without a 'dispatch' function (called by
+    # 'save()', 'download_episode()' and 'get_local_uri()'):
+    def run_completions(self):
+        while True:
+            try:
+                on_complete, success = self.completions.get_nowait()
+            except queue.Empty:
+                return
+            on_complete(success)
+
+    # Stops every running download (partial downloads resume next time):
+    def stop_downloads(self):
+        self.downloader.cancel_all()
+
+    # Deletes the least recently played downloads until the cache fits its
+    # quota, clearing their 'downloaded' flags so they are streamed instead.
+    # The playing episode and any 'protected' media urls are kept:
+    def enforce_media_quota(self, protected = ()):
+        protected = list(protected) + [episode.media[0]
+            for episode in self.get_active_episodes() if episode.media]
+        for media_url, feed_url, episode_pkid in self.media_cache.evict(protected):
+            print ('Database:\tEvicting download: ' + media_url)
+            self.remove_media_file(media_url)
+            feed = self.feed_index.get(feed_url)
+            if feed and episode_pkid < feed.get_episode_count():
+                self.set_downloaded(feed, episode_pkid, False)
+
+    # Deletes a downloaded media file:
+    def remove_media_file(self, media_url):
+        try:
+            os.remove(self.downloader.get_path(media_url))
+        except OSError:
+            pass
+
+    # Returns the episodes which are in use and must keep their downloads
+    # (overridden by 'PodBlast' to protect the playing episode):
+    def get_active_episodes(self):
+        return []
+
+    # Returns a 'file://' uri for an episode's local copy, or 'None' if the
+    # episode has not been downloaded:
+    def get_local_uri(self, episode):
+        self.run_completions()
+        if episode.downloaded and episode.media:
+            file_path = self.downloader.get_path(episode.media[0])
+            if os.path.exists(file_path):
+                return pathlib.Path(file_path).resolve().as_uri()
+        return None
\ No newline at end of file
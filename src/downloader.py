@@ -0,0 +1,184 @@
+#------------------------------------------------------------------------------#
+#
+#     Copyright 2014 by Konrad R.K. Ludwig.
+#
+#     This file is part of PodBlast.
+#
+#     PodBlast is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#     PodBlast is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#   along with PodBlast. If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------#
+
+import os
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen
+from fetcher import USER_AGENT
+
+#------------------------------------------------------------------------------#
+#     The following class caps the throughput of one or more transfers using a
+#   "token bucket" refilled at a fixed number of bytes per second.
+#------------------------------------------------------------------------------#
+
+class RateLimiter(object):
+    """
+    Blocks callers just long enough to keep the bytes passed to 'consume()'
+    under 'rate' bytes per second. A rate of 'None' disables the limit.
+    """
+    def __init__(self, rate = None):
+        self.rate = rate
+        self.allowance = rate
+        self.last_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.allowance = min(self.rate,
+                self.allowance + (now - self.last_time) * self.rate)
+            self.last_time = now
+            self.allowance -= amount
+            delay = -self.allowance / self.rate
+        if delay > 0:
+            time.sleep(delay)
+
+#------------------------------------------------------------------------------#
+#     The following class downloads episode media to a local cache directory
+#   on a bounded pool of background threads. Interrupted transfers leave a
+#   '.part' file behind and are resumed with an HTTP 'Range' request.
+#------------------------------------------------------------------------------#
+
+CHUNK_SIZE = 64 * 1024
+
+class DownloadManager(object):
+    """
+    Fetches remote media files into 'cache_dir', running at most
+    'max_downloads' transfers at once. 'max_rate' caps the combined bandwidth
+    and 'max_rate_per_download' caps each transfer (in bytes per second).
+    """
+    def __init__(self, cache_dir = 'data/media', max_downloads = 2,
+        max_rate = None, max_rate_per_download = None):
+        self.cache_dir = cache_dir
+        self.max_downloads = max_downloads
+        self.max_rate_per_download = max_rate_per_download
+        self.rate_limiter = RateLimiter(max_rate)
+        # Defines the worker pool (created on first use) and transfer state:
+        self.pool = None
+        self.active = set()
+        self.cancelled = set()
+        self.lock = threading.Lock()
+
+    # Returns the local path used to cache a media url:
+    def get_path(self, media_url):
+        name = hashlib.sha1(media_url.encode('utf-8')).hexdigest()[:16]
+        extension = os.path.splitext(urlsplit(media_url).path)[1]
+        return os.path.join(self.cache_dir, name + (extension or '.media'))
+
+    # Returns 'True' if a media url has been downloaded completely:
+    def is_downloaded(self, media_url):
+        return os.path.exists(self.get_path(media_url))
+
+    # Returns 'True' if a media url is queued or downloading:
+    def is_active(self, media_url):
+        with self.lock:
+            return media_url in self.active
+
+    # Queues a media url for download. 'callback(media_url, success)' is
+    # called from the worker thread when the transfer ends. Returns 'False' if
+    # the url is already being downloaded:
+    def download(self, media_url, callback = None):
+        with self.lock:
+            if media_url in self.active:
+                return False
+            self.active.add(media_url)
+            self.cancelled.discard(media_url)
+            if not self.pool:
+                self.pool = ThreadPoolExecutor(max_workers = self.max_downloads)
+        print ('DownloadManager:\tQueued download: ' + media_url)
+        self.pool.submit(self.transfer, media_url, callback)
+        return True
+
+    # Stops a queued or running download (keeping any partial data):
+    def cancel(self, media_url):
+        with self.lock:
+            if media_url in self.active:
+                self.cancelled.add(media_url)
+
+    # Stops every download (eg: when quitting):
+    def cancel_all(self):
+        with self.lock:
+            self.cancelled.update(self.active)
+
+    # Downloads a single media url, resuming from a partial file if present:
+    def transfer(self, media_url, callback):
+        success = False
+        path = self.get_path(media_url)
+        part_path = path + '.part'
+        try:
+            if not os.path.exists(path):
+                os.makedirs(self.cache_dir, exist_ok = True)
+                self.fetch(media_url, part_path)
+                if media_url in self.cancelled:
+                    print ('DownloadManager:\tCancelled download: ' + media_url)
+                    return
+                os.replace(part_path, path)
+            print ('DownloadManager:\tFinished download: ' + media_url)
+            success = True
+        except:
+            print ('DownloadManager:\tFailed to download: ' + media_url)
+        finally:
+            with self.lock:
+                self.active.discard(media_url)
+                self.cancelled.discard(media_url)
+            if callback:
+                try:
+                    callback(media_url, success)
+                except:
+                    print ('DownloadManager:\tFailed to complete download: '
+                        + media_url)
+
+    # Copies a remote file into 'part_path', appending to any partial data:
+    def fetch(self, media_url, part_path):
+        offset = 0
+        if os.path.exists(part_path):
+            offset = os.path.getsize(part_path)
+        request = Request(media_url)
+        request.add_header('User-Agent', USER_AGENT)
+        if offset:
+            request.add_header('Range', 'bytes=' + str(offset) + '-')
+        try:
+            response = urlopen(request, timeout = 30)
+        except HTTPError as error:
+            # The partial file already holds the whole resource:
+            if error.code == 416 and offset:
+                return
+            raise
+        with response:
+            # Starts over if the server ignored the 'Range' header:
+            if offset and response.status != 206:
+                offset = 0
+            limiter = RateLimiter(self.max_rate_per_download)
+            with open(part_path, 'ab' if offset else 'wb') as media_file:
+                while media_url not in self.cancelled:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    media_file.write(chunk)
+                    limiter.consume(len(chunk))
+                    self.rate_limiter.consume(len(chunk))
@@ -0,0 +1,157 @@
+#------------------------------------------------------------------------------#
+#
+#     Copyright 2014 by Konrad R.K. Ludwig.
+#
+#     This file is part of PodBlast.
+#
+#     PodBlast is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#     PodBlast is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#   along with PodBlast. If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------#
+
+import gzip
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen
+
+#------------------------------------------------------------------------------#
+#     The following function performs a conditional HTTP GET, sending any cached
+#   'ETag' and 'Last-Modified' validators so an unchanged feed can be answered
+#   with a '304 Not Modified' instead of the whole document.
+#------------------------------------------------------------------------------#
+
+USER_AGENT = 'PodBlast'
+
+class FetchResponse(object):
+    """
+    The status, body and cache validators returned by 'fetch_url()'. The body
+    is 'None' if the server answered '304 Not Modified'.
+    """
+    def __init__(self, status, body, etag, modified, content_type = None):
+        self.status = status
+        self.body = body
+        self.etag = etag
+        self.modified = modified
+        self.content_type = content_type
+
+def fetch_url (feed_url, etag = None, modified = None, timeout = 30):
+    request = Request(feed_url)
+    request.add_header('User-Agent', USER_AGENT)
+    request.add_header('Accept-Encoding', 'gzip')
+    if etag:
+        request.add_header('If-None-Match', etag)
+    if modified:
+        request.add_header('If-Modified-Since', modified)
+    try:
+        response = urlopen(request, timeout = timeout)
+    except HTTPError as error:
+        # 'urllib' reports anything other than a 2xx response as an error:
+        if error.code == 304:
+            return FetchResponse(304, None, etag, modified)
+        raise
+    with response:
+        body = response.read()
+        if response.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        return FetchResponse(
+            response.status,
+            body,
+            response.headers.get('ETag'),
+            response.headers.get('Last-Modified'),
+            response.headers.get('Content-Type')
+            )
+
+#------------------------------------------------------------------------------#
+#     The following class runs feed fetches on a bounded pool of worker threads
+#   so that refreshing a large subscription list does not have to wait on each
+#   remote server in turn.
+#------------------------------------------------------------------------------#
+
+class FeedFetcher(object):
+    """
+    Fetches remote feeds in parallel using a bounded pool of worker threads
+    while limiting the number of simultaneous connections made to any single
+    host.
+    """
+    def __init__(self, max_workers = 8, max_per_host = 2):
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        # Defines one semaphore per remote host (created on demand):
+        self.host_semaphores = {}
+        self.host_semaphores_lock = threading.Lock()
+
+    # Returns the semaphore guarding connections to the host of a given url:
+    def get_host_semaphore (self, feed_url):
+        host = urlsplit(feed_url).netloc.lower()
+        with self.host_semaphores_lock:
+            if host not in self.host_semaphores:
+                self.host_semaphores[host] = threading.BoundedSemaphore(
+                    self.max_per_host)
+            return self.host_semaphores[host]
+
+    # Runs a single fetch once a connection slot for its host is free (the
+    # slots are shared by every 'fetch_all()' running at once):
+    def fetch_limited (self, fetch, feed_url):
+        with self.get_host_semaphore(feed_url):
+            return fetch(feed_url)
+
+    # Calls 'fetch(feed_url)' for every url on the worker pool and hands each
+    # '(feed_url, result)' pair to 'callback' in the calling thread as soon as
+    # it completes. Failed fetches are reported with a result of 'None'.
+    # 'max_workers' overrides the pool size (eg: for bulk imports). Urls wait
+    # in a queue per host and are only handed to the pool while their host
+    # has a free connection slot, so workers never sit blocked on a busy host
+    # while urls of other hosts are waiting:
+    def fetch_all (self, feed_urls, fetch, callback, max_workers = None):
+        feed_urls = list(feed_urls)
+        if not feed_urls:
+            return
+        workers = min(max_workers or self.max_workers, len(feed_urls))
+        # Defines the queued urls and running fetches of each host, and the
+        # hosts with both queued urls and a free slot (taken in turn):
+        host_queues = OrderedDict()
+        for feed_url in feed_urls:
+            host = urlsplit(feed_url).netloc.lower()
+            host_queues.setdefault(host, deque()).append(feed_url)
+        host_running = dict.fromkeys(host_queues, 0)
+        ready_hosts = deque(host_queues)
+        futures = {}
+        with ThreadPoolExecutor(max_workers = workers) as pool:
+            while futures or ready_hosts:
+                # Fills the free workers from the ready hosts:
+                while ready_hosts and len(futures) < workers:
+                    host = ready_hosts.popleft()
+                    feed_url = host_queues[host].popleft()
+                    future = pool.submit(self.fetch_limited, fetch, feed_url)
+                    futures[future] = (host, feed_url)
+                    host_running[host] += 1
+                    if (host_queues[host]
+                        and host_running[host] < self.max_per_host):
+                        ready_hosts.append(host)
+                done = wait(futures, return_when = FIRST_COMPLETED)[0]
+                for future in done:
+                    host, feed_url = futures.pop(future)
+                    # The host is ready again if it was at its limit:
+                    host_running[host] -= 1
+                    if (host_queues[host]
+                        and host_running[host] == self.max_per_host - 1):
+                        ready_hosts.append(host)
+                    try:
+                        result = future.result()
+                    except:
+                        print ('FeedFetcher:\tFailed to fetch feed: ' + feed_url)
+                        result = None
+                    callback(feed_url, result)
@@ -20,11 +20,14 @@
 #------------------------------------------------------------------------------#
 
 import sys
+import threading
+from collections import OrderedDict
 import pbutils
 import podblast
 import gtkinterface
 try:
     from gi.repository import GObject
+    GObject.threads_init()
 except:
     print ("Error: Failed to load GObject bindings for Python.")
     sys.exit(1)
@@ -43,28 +46,66 @@ class GTKHandler(object):
     The link between the PodBlast front-end and the PodBlast back-end objects.
     Takes signals from the front-end and syncronizes events with the back-end.
     """
-    def __init__(self):
+    def __init__(self, audio_sink = 'pulse'):
         print ('Initializing GTK signal handler...')
         # Instantiates and connects GTK/Glade user interface component:
-        self.pb = podblast.PodBlast()
+        self.pb = podblast.PodBlast(audio_sink)
         self.ux = gtkinterface.GTKInterface()
 
         # Connecting signnal handlers:
         self.ux.gtk_builder.connect_signals(self)
         self.on_position_changed_id = self.ux.time_scale_adjustment.connect(
             'value_changed', self.on_position_changed)
-
-        # Define timeout loops to update the GUI:
-        self.slider_timeout = GObject.timeout_add(100, self.refresh_controls)
+        self.ux.main_window.connect(
+            'window-state-event', self.on_main_window_state_event)
+        self.pb.stream.duration_callback = self.on_duration_changed
+
+        # Follows the back-end when playback advances to the next episode:
+        self.pb.advance_callback = self.on_episode_advanced
+        self.pb.dispatch = GObject.idle_add
+
+        # Defines the background threads used to refresh and import feeds:
+        self.refresh_thread = None
+        self.import_thread = None
+        # Tracks feeds being added in the background. Each is shown by a
+        # placeholder row with a negative id, mapped to its registration and
+        # a reference to the row:
+        self.pending_feeds = OrderedDict()
+        self.placeholder_count = 0
+        self.restoring_feed_combo = False
+        # Set while the rate selector and trimming toggle are updated to match
+        # the back-end:
+        self.restoring_controls = False
+
+        # Defines the timeout used to update the time slider. It only runs
+        # while playing with the window visible (see 'update_position_timer()'):
+        self.position_timeout = None
+        self.position_interval = None
+        # Tracks whether the time slider is being dragged:
+        self.time_scale_dragging = False
+
+        # Defines the timeout used to checkpoint resume positions:
+        self.checkpoint_timeout = None
+
+        # Defines the most episodes listed for a search (the best matches):
+        self.search_limit = 500
 
     # Populates all of the GUI data before starting the GTK+ loop:
     def main (self):
         self.pb.load()
+        self.start_search_index()
         self.rebuild_feed_list()
         self.rebuild_episode_list()
+        self.checkpoint_timeout = GObject.timeout_add_seconds(
+            self.pb.checkpoint_interval, self.on_checkpoint)
         self.ux.main()
 
     def main_quit (self):
+        if self.checkpoint_timeout:
+            GObject.source_remove(self.checkpoint_timeout)
+            self.checkpoint_timeout = None
+        self.cancel_pending_feeds()
+        self.pb.stop_downloads()
         self.null()
         self.pb.save()
         self.ux.main_quit()
@@ -76,6 +117,10 @@ class GTKHandler(object):
         print('----------------- on_main_window_delete_event ------------------')
         self.main_quit()
 
+    def on_main_window_state_event (self, window, event):
+        self.ux.set_window_state(event)
+        self.update_position_timer()
+
     def on_about (self, *args):
         print('-------------------------- on_about ----------------------------')
         self.ux.about_dialog.show()
@@ -87,7 +132,8 @@ class GTKHandler(object):
     def on_new (self, *args):
         print('--------------------------- on_new -----------------------------')
         # Reset database:
-        self.pb.feeds = []
+        self.cancel_pending_feeds()
+        self.pb.clear()
         self.pb.file_path = self.pb.default_file_path
         self.set(None, None)
         # Refresh GUI:
@@ -99,8 +145,10 @@ class GTKHandler(object):
         print('--------------------------- on_load ----------------------------')
         file_path = self.ux.load_dialog()
         if file_path != None:
+            self.cancel_pending_feeds()
             self.pb.file_path = file_path
             self.pb.load(self.pb.file_path)
+            self.start_search_index()
             self.pb.stop()
             # Refresh GUI:
             self.rebuild_feed_list()
@@ -118,21 +166,97 @@ class GTKHandler(object):
             self.pb.save(self.pb.file_path)
             self.ux.error_dialog('Subscription list saved.')
 
+    def on_import_opml (self, *args):
+        print('------------------------ on_import_opml ------------------------')
+        if self.import_thread and self.import_thread.is_alive():
+            self.ux.error_dialog('Import already in progress.')
+            return
+        file_path = self.ux.load_dialog('Import OPML')
+        if file_path == None:
+            return
+        try:
+            feed_urls = self.pb.read_opml_feed_urls(file_path)
+        except:
+            self.ux.error_dialog('Could not read OPML file.')
+            return
+        if not feed_urls:
+            self.ux.error_dialog('No new feeds to import.')
+            return
+        # Fetches feeds in the background, adding them on the GTK loop:
+        self.ux.set_status('Importing feeds...')
+        self.import_thread = threading.Thread(
+            target = self.pb.import_feeds,
+            args = (feed_urls, self.on_import_progress, GObject.idle_add)
+            )
+        self.import_thread.daemon = True
+        self.import_thread.start()
+
+    # Called on the GTK loop each time an imported feed has been fetched:
+    def on_import_progress (self, completed, total, feed_url, success):
+        self.ux.set_status('Imported ' + str(completed) + ' of '
+            + str(total) + ' feeds')
+        if completed == total:
+            self.rebuild_feed_list()
+            self.ux.set_status(None)
+
+    def on_export_opml (self, *args):
+        print('------------------------ on_export_opml ------------------------')
+        file_path = self.ux.save_dialog('Export OPML')
+        if file_path != None:
+            if self.pb.export_opml(file_path):
+                self.ux.error_dialog('Subscription list exported.')
+            else:
+                self.ux.error_dialog('Could not export subscription list.')
+
     def on_add_feed (self, button):
         print('------------------------- on_add_feed --------------------------')
         self.ux.add_feed_show()
 
     def on_add_feed_ok_clicked (self, button):
         print('------------------- on_add_feed_ok_clicked ---------------------')
-        feed_url = pbutils.validate_url(
-            self.ux.get_add_feed_url()
-            )
-        if feed_url:
-            self.pb.register_feed(feed_url)
-            self.ux.add_feed_hide()
-            self.rebuild_feed_list()
-        else:
+        feed_urls = pbutils.validate_urls([self.ux.get_add_feed_url()])
+        feed_url = feed_urls[0] if feed_urls else None
+        if not feed_url:
             self.ux.error_dialog ('Invalid URL')
+        elif (not self.pb.filter_new_feed_urls([feed_url])
+            or feed_url in [registration.feed_url
+            for registration, row_reference in self.pending_feeds.values()]):
+            self.ux.error_dialog ('Feed already registered.')
+        else:
+            # Closes the dialog straight away and fetches the feed in the
+            # background, showing a placeholder row until it is added:
+            self.ux.add_feed_hide()
+            registration = self.pb.register_feed_background(
+                feed_url, self.on_feed_registered, GObject.idle_add)
+            self.placeholder_count += 1
+            placeholder_id = -self.placeholder_count
+            row_reference = self.ux.append_feed_row(
+                [placeholder_id, 'Adding ' + feed_url + '...'])
+            self.pending_feeds[placeholder_id] = [registration, row_reference]
+            self.ux.set_status('Adding feed...')
+
+    # Called on the GTK loop when a feed added in the background has been
+    # fetched. Swaps the placeholder row for the feed (or removes it):
+    def on_feed_registered (self, feed_url, success):
+        for placeholder_id, pending_feed in list(self.pending_feeds.items()):
+            registration, row_reference = pending_feed
+            if registration.feed_url != feed_url or registration.cancelled:
+                continue
+            del self.pending_feeds[placeholder_id]
+            if success:
+                self.ux.set_feed_row(row_reference, [
+                    self.pb.get_feed_pkid(feed_url),
+                    self.pb.get_feed(feed_url).title])
+                self.ux.set_status(None)
+            else:
+                self.ux.set_feed_row(row_reference, None)
+                self.ux.set_status('Failed to add feed')
+
+    # Cancels every feed being added in the background:
+    def cancel_pending_feeds (self):
+        for registration, row_reference in self.pending_feeds.values():
+            registration.cancel()
+        self.pending_feeds.clear()
 
     def on_add_feed_cancel_clicked (self, button):
         print('----------------- on_add_feed_cancel_clicked -------------------')
@@ -140,7 +264,69 @@ class GTKHandler(object):
 
     def on_refresh_feeds (self, *args):
         print('---------------------- on_refresh_feeds ------------------------')
-        self.ux.error_dialog('Refresh not yet implemented.')
+        if self.refresh_thread and self.refresh_thread.is_alive():
+            self.ux.error_dialog('Refresh already in progress.')
+        elif not self.pb.feeds:
+            self.ux.error_dialog('No feeds to refresh.')
+        else:
+            # Fetches feeds in the background, merging results on the GTK loop:
+            self.ux.set_status('Refreshing feeds...')
+            self.refresh_thread = threading.Thread(
+                target = self.pb.refresh_feeds,
+                args = (self.on_refresh_progress, GObject.idle_add)
+                )
+            self.refresh_thread.daemon = True
+            self.refresh_thread.start()
+
+    # Called on the GTK loop each time a feed has finished refreshing:
+    def on_refresh_progress (self, completed, total, feed_url, new_episodes):
+        self.ux.set_status('Refreshed ' + str(completed) + ' of '
+            + str(total) + ' feeds')
+        actv_feed_pkid = self.ux.actv_feed_pkid
+        if (new_episodes
+            and actv_feed_pkid != None
+            and self.pb.feeds[actv_feed_pkid].url == feed_url):
+            self.rebuild_episode_list()
+        if completed == total:
+            self.ux.set_status(None)
+
+    def on_download_episode (self, *args):
+        print('-------------------- on_download_episode -----------------------')
+        feed_pkid = self.ux.actv_feed_pkid
+        episode_pkid = self.ux.get_epsd_pkid()
+        if feed_pkid == None or episode_pkid == None:
+            self.ux.error_dialog('Please select an episode to download.')
+        elif self.pb.feeds[feed_pkid].episodes[episode_pkid].downloaded:
+            self.ux.error_dialog('Episode already downloaded.')
+        elif self.pb.download_episode(feed_pkid, episode_pkid,
+            self.on_download_complete, GObject.idle_add):
+            self.ux.set_status('Downloading episode...')
+
+    # Called on the GTK loop when an episode download has finished:
+    def on_download_complete (self, feed_url, episode_pkid, success):
+        if success:
+            self.ux.set_status(None)
+        else:
+            self.ux.set_status('Download failed')
+
+    # Called on the GTK loop when playback moves on to the next episode or
+    # reaches the end of the feed:
+    def on_episode_advanced (self):
+        self.sync_ux_state()
+        if self.pb.actv_epsd_pkid != None:
+            self.ux.play()
+        else:
+            self.ux.stop()
+
+    # Builds the search index a feed at a time while the GTK loop is idle, so
+    # the first search does not have to build it:
+    def start_search_index (self):
+        self.pb.start_search_index()
+        GObject.idle_add(self.pb.index_next_feed)
+
+    def on_search_changed (self, search_entry):
+        print('--------------------- on_search_changed ------------------------')
+        self.rebuild_episode_list()
 
     def on_configure_feeds (self, *args):
         print('--------------------- on_configure_feeds -----------------------')
@@ -148,11 +334,31 @@ class GTKHandler(object):
 
     def on_feed_combo_changed (self, feed_combo):
         print('-------------------- on_feed_combo_changed ---------------------')
+        if self.restoring_feed_combo:
+            return
         # Gets the new feed pkid from the GUI and sets the tracker:
         feed_pkid = self.ux.get_feed_pkid()
+        if feed_pkid != None and feed_pkid < 0:
+            self.on_placeholder_selected(feed_pkid)
+            return
         self.set(feed_pkid, None)
         self.rebuild_episode_list()
 
+    # Offers to cancel a feed which is still being added, then selects the
+    # active feed again:
+    def on_placeholder_selected (self, placeholder_id):
+        if placeholder_id in self.pending_feeds:
+            registration, row_reference = self.pending_feeds[placeholder_id]
+            if self.ux.confirm_dialog('Cancel',
+                'Stop adding ' + registration.feed_url + '?'):
+                registration.cancel()
+                del self.pending_feeds[placeholder_id]
+                self.ux.set_feed_row(row_reference, None)
+                self.ux.set_status(None)
+        self.restoring_feed_combo = True
+        self.ux.set_feed_pkid(self.pb.actv_feed_pkid)
+        self.restoring_feed_combo = False
+
     def on_episode_treeview_row_activated (self, *args):
         print('-------------- on_episode_treeview_row_activated ---------------')
         # Get PKID data from GUI:
@@ -195,16 +401,86 @@ class GTKHandler(object):
         print('-------------------- on_rwnd_button_clicked --------------------')
         self.rwnd()
 
+    def on_rate_changed (self, rate_combo):
+        print('----------------------- on_rate_changed ------------------------')
+        if self.restoring_controls:
+            return
+        self.pb.set_rate(self.ux.get_rate())
+        self.update_position_timer()
+
+    def on_trim_silence_toggled (self, menuitem):
+        print('------------------- on_trim_silence_toggled --------------------')
+        if self.restoring_controls:
+            return
+        self.pb.set_trim_silence(self.ux.get_trim_silence())
+        self.sync_ux_state()
+
+    # Seeks as the slider moves. While it is dragged, fast key-unit seeks
+    # follow it (the stream coalesces them) and an accurate seek to the final
+    # position is made on release:
     def on_position_changed (self, slider):
-        print('--------------------- on_position_changed ----------------------')
         new_position = self.ux.get_time_scale_position()
-        self.pb.set_position(new_position)
+        self.pb.set_position(new_position, not self.time_scale_dragging)
+        self.ux.set_time_position_label(new_position)
+
+    def on_time_scale_pressed (self, slider, event):
+        self.time_scale_dragging = True
+        return False
+
+    def on_time_scale_released (self, slider, event):
+        if self.time_scale_dragging:
+            self.time_scale_dragging = False
+            self.pb.set_position(self.ux.get_time_scale_position())
+        return False
+
+    # Saves the playing episode's position every few seconds:
+    def on_checkpoint (self):
+        self.pb.checkpoint()
+        return True
+
+    # Called on the GTK loop when the stream's duration becomes known:
+    def on_duration_changed (self, duration):
+        self.refresh_controls()
+        self.update_position_timer()
 
     #---------------- ----- --- --- - - - -  -     -
-    # GUI timout loop to refresh slider and controls (stops the update to allow
-    # seeking via slider):
+    # GUI timeout loop to refresh slider and controls. The slider is only
+    # polled while playing with the window visible, about as often as it moves
+    # by one pixel (but at least once a second for the position label):
+
+    # Returns the polling interval in milliseconds for the current duration,
+    # playback rate and slider width:
+    def get_position_interval (self):
+        duration = self.pb.get_duration() / self.pb.get_rate()
+        width = self.ux.get_time_scale_width()
+        if duration <= 0 or width <= 0:
+            return 1000
+        return min(1000, max(100, int(1000 * duration / width)))
+
+    # Starts, stops or re-times the position timeout to suit the player state:
+    def update_position_timer (self):
+        if (self.pb.get_player_state() == 'PLAYING'
+            and self.ux.is_visible()):
+            interval = self.get_position_interval()
+        else:
+            interval = None
+        if interval == self.position_interval:
+            return
+        if self.position_timeout:
+            GObject.source_remove(self.position_timeout)
+            self.position_timeout = None
+        self.position_interval = interval
+        if interval:
+            self.position_timeout = GObject.timeout_add(
+                interval, self.refresh_controls)
+        # Refreshes the slider straight away (eg: to show the final position
+        # once polling stops):
+        self.refresh_controls()
 
     def refresh_controls (self):
+        # Leaves the slider to the user while it is dragged:
+        if self.time_scale_dragging:
+            return self.position_timeout != None
         # Gets position data from back-end:
         position_data = self.pb.get_position()
         # Blocks position signal:
@@ -215,7 +491,7 @@ class GTKHandler(object):
         # Unblocks position signal:
         self.ux.time_scale_adjustment.handler_unblock(
             self.on_position_changed_id)
-        return True
+        return self.position_timeout != None
 
     #---------------- ----- --- --- - - - -  -     -
     # Front- and back-end component synchronization:
@@ -225,7 +501,12 @@ class GTKHandler(object):
         self.ux.actv_feed_pkid = self.pb.actv_feed_pkid
         self.ux.actv_epsd_pkid = self.pb.actv_epsd_pkid
         self.ux.player_state = self.pb.get_player_state()
-        self.ux.actv_epsd_duration = self.pb.get_position()[1]
+        self.ux.actv_epsd_duration = self.pb.get_duration()
+        self.restoring_controls = True
+        self.ux.set_rate(self.pb.get_rate())
+        self.ux.set_trim_silence(self.pb.get_trim_silence())
+        self.restoring_controls = False
+        self.update_position_timer()
 
     #---------------- ----- --- --- - - - -  -     -
     # Player control connections:
@@ -285,25 +566,33 @@ class GTKHandler(object):
             self.ux.rebuild_feed_list(feed_titles)
         else:
             self.ux.feed_list.clear()
+        # Shows the placeholders of feeds still being added:
+        for placeholder_id, pending_feed in self.pending_feeds.items():
+            pending_feed[1] = self.ux.append_feed_row([placeholder_id,
+                'Adding ' + pending_feed[0].feed_url + '...'])
 
     # Collects episode data from the PodBlast back-end and passes it to the GTK
-    # front-end so it can uprate the user interface.
+    # front-end so it can uprate the user interface. Rows are generated as the
+    # front-end adds them, rather than collected into a list first. If the
+    # search box holds a query only matching episodes are listed:
     def rebuild_episode_list (self):
         if self.ux.actv_feed_pkid != None:
             self.ux.episode_treeview.set_sensitive(True)
-            if self.pb.feeds[self.ux.actv_feed_pkid].episodes:
-                episode_input = []
-                for index, episode in enumerate(
-                    self.pb.feeds[self.ux.actv_feed_pkid].episodes):
-                    episode_input.append([
-                        index,                  # Index
-                        False,                  # isPlaying
-                        episode.title,          # Title
-                        episode.is_new,         # isNew
-                        400,                    # FontWeight
-                        'media-playback-start'  # IconName
-                        ])
-                self.ux.rebuild_episode_list(episode_input)
+            feed = self.pb.feeds[self.ux.actv_feed_pkid]
+            query = self.ux.get_search_query()
+            matches = None
+            if query:
+                matches = set(episode_pkid for result_feed, episode_pkid
+                    in self.pb.search(query, feed.url, self.search_limit))
+            self.ux.rebuild_episode_list([
+                index,                  # Index
+                False,                  # isPlaying
+                episode.title,          # Title
+                episode.is_new,         # isNew
+                400,                    # FontWeight
+                'media-playback-start'  # IconName
+                ] for index, episode in enumerate(feed.episodes)
+                    if matches == None or index in matches)
         else:
             self.ux.episode_treeview.set_sensitive(False)
             self.ux.episode_list.clear()
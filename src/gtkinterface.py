@@ -22,7 +22,7 @@
 import sys
 from pbutils import format_time
 try:
-    from gi.repository import Gtk
+    from gi.repository import Gtk, Gdk
 except:
     print ("Error: Failed to load GTK+ bindings for Python.")
     sys.exit(1)
@@ -40,6 +40,10 @@ class GTKInterface(object):
         self.actv_feed_pkid = None
         self.actv_epsd_pkid = None
         self.player_state = 'NULL'
+        # Tracks the episode whose row is currently marked as playing, and
+        # 'Gtk.TreeRowReference' objects to episode rows by PKID:
+        self.shown_epsd_pkid = None
+        self.episode_rows = {}
 
         # Defines the GTK/Glade interface source file and 'Gtk.Builder' object.
         self.ux_source = 'ux/podblast.glade'
@@ -60,6 +64,7 @@ class GTKInterface(object):
         self.feed_list = self.gtk_builder.get_object('feed_list')
         self.episode_treeview = self.gtk_builder.get_object('episode_treeview')
         self.episode_list = self.gtk_builder.get_object('episode_list')
+        self.search_entry = self.gtk_builder.get_object('search_entry')
 
         # Links to player buttons:
         self.prev_button = self.gtk_builder.get_object('prev_button')
@@ -75,6 +80,15 @@ class GTKInterface(object):
         self.time_duration_label = self.gtk_builder.get_object('time_duration_label')
         self.time_scale = self.gtk_builder.get_object('time_scale')
         self.time_scale_adjustment = self.gtk_builder.get_object('time_scale_adjustment')
+        self.rate_combo = self.gtk_builder.get_object('rate_combo')
+        self.trim_silence_menuitem = self.gtk_builder.get_object(
+            'trim_silence_menuitem')
+
+        # Tracks the seconds shown on the time labels (so unchanged labels are
+        # not redrawn) and whether the main window is minimized:
+        self.shown_position = None
+        self.shown_duration = None
+        self.iconified = False
 
     # Draws all the windows and starts the GTK+ loop:
     def main (self):
@@ -100,44 +114,116 @@ class GTKInterface(object):
         for feed_title in feed_titles:
             self.feed_list.append(feed_title)
 
-    # Replaces the episode list with a new list:
+    # Appends a row to the feed list, returning a 'Gtk.TreeRowReference' to it:
+    def append_feed_row (self, feed_row):
+        feed_iter = self.feed_list.append(feed_row)
+        return Gtk.TreeRowReference.new(
+            self.feed_list, self.feed_list.get_path(feed_iter))
+
+    # Replaces the data of a referenced feed row, or removes the row if
+    # 'feed_row' is 'None':
+    def set_feed_row (self, row_reference, feed_row):
+        if row_reference.valid():
+            feed_iter = self.feed_list.get_iter(row_reference.get_path())
+            if feed_row:
+                self.feed_list.set_row(feed_iter, feed_row)
+            else:
+                self.feed_list.remove(feed_iter)
+
+    # Selects the feed with a given PKID in the feed selector (or nothing):
+    def set_feed_pkid (self, feed_pkid):
+        for feed in self.feed_list:
+            if feed[0] == feed_pkid:
+                self.feed_combo.set_active_iter(feed.iter)
+                return
+        self.feed_combo.set_active(-1)
+
+    # Replaces the episode list with new rows. Each row's play state is set
+    # before it is added and the list is detached from the view while it is
+    # filled, so the view is only redrawn once:
     def rebuild_episode_list (self, episode_input):
         # print ('rebuild_episode_list() called.')
+        self.episode_treeview.set_model(None)
         self.episode_list.clear()
+        self.episode_rows = {}
         for episode in episode_input:
+            self.refresh_episode_row(episode)
             self.episode_list.append(episode)
-        self.refresh_episode_list()
+        self.shown_epsd_pkid = self.actv_epsd_pkid
+        self.episode_treeview.set_model(self.episode_list)
         # adjustment = self.episode_treeview.get_vadjustment()
-        self.episode_treeview.scroll_to_cell(len(self.episode_list) - 1)
+        if len(self.episode_list):
+            self.episode_treeview.scroll_to_cell(len(self.episode_list) - 1)
 
-    # Updates the front-end data to reflect the player state.
+    # Updates the front-end data to reflect the player state. Only the rows
+    # of the previously and currently active episodes can change:
     def refresh_episode_list (self):
         print ('GTKInterface:\trefresh_episode_list() called.')
-        for episode in self.episode_list:
-            # Sets icon marking the currently playing episode:
-            if episode[0] == self.actv_epsd_pkid:
-                episode[1] = True
-                if self.player_state == 'PLAYING':
-                    episode[5] = 'media-playback-start'
-                else:
-                    episode[5] = 'media-playback-pause'
+        for episode_pkid in set([self.shown_epsd_pkid, self.actv_epsd_pkid]):
+            episode = self.get_episode_row(episode_pkid)
+            if episode:
+                self.refresh_episode_row(episode)
+        self.shown_epsd_pkid = self.actv_epsd_pkid
+
+    # Returns the row of an episode, or 'None' if it is not listed:
+    def get_episode_row (self, episode_pkid):
+        if episode_pkid == None:
+            return None
+        reference = self.episode_rows.get(episode_pkid)
+        if not reference or not reference.valid():
+            reference = self.find_episode_row(episode_pkid)
+            if not reference:
+                return None
+            self.episode_rows[episode_pkid] = reference
+        return self.episode_list[reference.get_path()]
+
+    # Returns a 'Gtk.TreeRowReference' to an episode's row, or 'None'. Rows
+    # are listed in PKID order, so the row at the PKID's index is tried before
+    # searching. References are only made for rows which change state, since
+    # GTK updates every reference each time a row is added or removed:
+    def find_episode_row (self, episode_pkid):
+        if (episode_pkid < len(self.episode_list)
+            and self.episode_list[episode_pkid][0] == episode_pkid):
+            path = Gtk.TreePath(episode_pkid)
+        else:
+            for episode in self.episode_list:
+                if episode[0] == episode_pkid:
+                    path = episode.path
+                    break
             else:
-                episode[1] = False
-
-            # Bolds unheard podcasts:
-            if episode[3] == True:
-                episode[4] = 700
+                return None
+        return Gtk.TreeRowReference.new(self.episode_list, path)
+
+    # Sets the icon and font weight of a single row:
+    def refresh_episode_row (self, episode):
+        # Sets icon marking the currently playing episode:
+        if episode[0] == self.actv_epsd_pkid:
+            episode[1] = True
+            if self.player_state == 'PLAYING':
+                episode[5] = 'media-playback-start'
             else:
-                episode[4] = 400
+                episode[5] = 'media-playback-pause'
+        else:
+            episode[1] = False
+
+        # Bolds unheard podcasts:
+        if episode[3] == True:
+            episode[4] = 700
+        else:
+            episode[4] = 400
 
     # Un-bolds podcasts which have been played.
     def mark_old (self):
         # print ('GTKInterface:\tmark_old() called.')
-        for episode in self.episode_list:
-            if episode[0] == self.actv_epsd_pkid:
-                print ('GTKInterface:\tMarking episode #'
-                    + str(self.actv_epsd_pkid) + ' as "old".')
-                episode[3] = False
+        episode = self.get_episode_row(self.actv_epsd_pkid)
+        if episode:
+            print ('GTKInterface:\tMarking episode #'
+                + str(self.actv_epsd_pkid) + ' as "old".')
+            episode[3] = False
+
+    # Returns the text typed into the episode search box:
+    def get_search_query (self):
+        return self.search_entry.get_text().strip()
 
     # Fetches the PKID of the currently selected feed.
     def get_feed_pkid (self):
@@ -152,7 +238,8 @@ class GTKInterface(object):
         # print ('get_epsd_pkid() called.')
         episode_iter = self.episode_treeview.get_selection().get_selected()[1]
         # print ('Episode iter: ' + str(self.episode_list[episode_iter][0]))
-        return self.episode_list[episode_iter][0]
+        if episode_iter:
+            return self.episode_list[episode_iter][0]
 
     #---------------- ----- --- --- - - - -  -     -
     # Surrogate player controls (update's ux state):
@@ -185,20 +272,67 @@ class GTKInterface(object):
         self.set_time_scale_position(position)
 
     def set_time_scale_duration (self, duration):
-        duration = int(round(duration, 0))
-        duration_string = format_time(duration).strftime('%H:%M:%S')
         self.time_scale_adjustment.set_upper(duration)
-        self.time_duration_label.set_text(duration_string)
+        duration = int(round(duration, 0))
+        if duration != self.shown_duration:
+            self.shown_duration = duration
+            duration_string = format_time(duration).strftime('%H:%M:%S')
+            self.time_duration_label.set_text(duration_string)
 
     def set_time_scale_position (self, position):
-        position = int(round(position, 0))
-        position_string = format_time(position).strftime('%H:%M:%S')
         self.time_scale_adjustment.set_value(position)
-        self.time_position_label.set_text(position_string)
+        self.set_time_position_label(position)
+
+    # Updates the position label (only when the shown second changes):
+    def set_time_position_label (self, position):
+        position = int(round(position, 0))
+        if position != self.shown_position:
+            self.shown_position = position
+            position_string = format_time(position).strftime('%H:%M:%S')
+            self.time_position_label.set_text(position_string)
 
     def get_time_scale_position (self):
         return self.time_scale_adjustment.get_value()
 
+    # Returns the width of the time slider in pixels:
+    def get_time_scale_width (self):
+        return self.time_scale.get_allocated_width()
+
+    # Tracks whether the main window is minimized from a 'window-state-event':
+    def set_window_state (self, event):
+        self.iconified = bool(
+            event.new_window_state & Gdk.WindowState.ICONIFIED)
+
+    # Returns 'True' if the main window can be seen (ie: not hidden or
+    # minimized):
+    def is_visible (self):
+        return self.main_window.get_visible() and not self.iconified
+
+    #---------------- ----- --- --- - - - -  -     -
+    # Playback rate selector and silence trimming toggle:
+
+    # Shows a playback rate, adding it to the selector if it is not listed:
+    def set_rate (self, rate):
+        rate_id = str(float(rate))
+        if not self.rate_combo.set_active_id(rate_id):
+            self.rate_combo.append(rate_id, rate_id + '×')
+            self.rate_combo.set_active_id(rate_id)
+
+    # Returns the selected playback rate:
+    def get_rate (self):
+        rate_id = self.rate_combo.get_active_id()
+        if rate_id:
+            return float(rate_id)
+        return 1.0
+
+    # Shows whether silence is trimmed (only selectable with a feed active):
+    def set_trim_silence (self, trim_silence):
+        self.trim_silence_menuitem.set_active(trim_silence)
+        self.trim_silence_menuitem.set_sensitive(self.actv_feed_pkid != None)
+
+    def get_trim_silence (self):
+        return self.trim_silence_menuitem.get_active()
+
     #---------------- ----- --- --- - - - -  -     -
     # Player GTK+ button "sensitivity" states:
 
@@ -260,6 +394,16 @@ class GTKInterface(object):
         else:
             self.set_player_buttons('NULL')
 
+    #---------------- ----- --- --- - - - -  -     -
+    # Status reporting:
+
+    # Shows a short status message in the main window title (or clears it):
+    def set_status (self, message):
+        if message:
+            self.main_window.set_title('PodBlast - ' + message)
+        else:
+            self.main_window.set_title('PodBlast')
+
     #---------------- ----- --- --- - - - -  -     -
     # Dialog windows:
 
@@ -308,9 +452,9 @@ class GTKInterface(object):
     # Save/Load dialogues:
 
     # A file-chooser to load a specific file:
-    def load_dialog (self):
+    def load_dialog (self, title = "Open Database"):
         file_chooser = Gtk.FileChooserDialog(
-            "Open Database",    # Title
+            title,              # Title
             None,               # Parent
             Gtk.FileChooserAction.OPEN,
             (Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
@@ -327,9 +471,9 @@ class GTKInterface(object):
             return None
 
     # A file-chooser to save to a specific file:
-    def save_dialog (self):
+    def save_dialog (self, title = "Open Database"):
         file_chooser = Gtk.FileChooserDialog(
-            "Open Database",    # Title
+            title,              # Title
             None,               # Parent
             Gtk.FileChooserAction.SAVE,
             (Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
@@ -19,13 +19,58 @@
 #
 #------------------------------------------------------------------------------#
 
-import gtkhandler
+import argparse
 # Captures a 'Ctrl+C' signal from the terminal:
 import signal
 signal.signal(signal.SIGINT, signal.SIG_DFL)
 
 #------------------------------------------------------------------------------#
+#     PodBlast normally runs with its GTK interface. With '--headless' only the
+#   back-end runs (no display is needed): it plays an episode, carries on
+#   through the rest of its feed and exits at the end, eg:
+#
+#       python3 src/main.py --headless 0 0 --sink fake
+#------------------------------------------------------------------------------#
+
+# Plays from an episode to the end of its feed on a 'GLib' main loop:
+def run_headless (feed_pkid, episode_pkid, audio_sink):
+    import podblast
+    from gi.repository import GLib
+    loop = GLib.MainLoop()
+    pb = podblast.PodBlast(audio_sink)
+    pb.dispatch = GLib.idle_add
+    def on_advanced ():
+        if pb.actv_epsd_pkid == None:
+            loop.quit()
+    pb.advance_callback = on_advanced
+    def on_checkpoint ():
+        pb.checkpoint()
+        return True
+    pb.load()
+    pb.set(feed_pkid, episode_pkid)
+    if pb.actv_epsd_pkid == None:
+        return
+    pb.play_pause()
+    GLib.timeout_add_seconds(pb.checkpoint_interval, on_checkpoint)
+    try:
+        loop.run()
+    finally:
+        pb.stop_downloads()
+        pb.null()
+        pb.save()
 
 if __name__ == '__main__':
-    frontend = gtkhandler.GTKHandler()
-    frontend.main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description = 'Plays podcasts.')
+    parser.add_argument('--sink', help = 'audio output: pulse, alsa, auto, '
+        'fake, a GStreamer sink name or file:<path> (default: pulse, or fake '
+        'when headless)')
+    parser.add_argument('--headless', nargs = 2, type = int,
+        metavar = ('FEED', 'EPISODE'),
+        help = 'play from an episode (by PKID) without the interface')
+    args = parser.parse_args()
+    if args.headless:
+        run_headless(args.headless[0], args.headless[1], args.sink or 'fake')
+    else:
+        import gtkhandler
+        frontend = gtkhandler.GTKHandler(args.sink or 'pulse')
+        frontend.main()
@@ -0,0 +1,104 @@
+#------------------------------------------------------------------------------#
+#
+#     Copyright 2014 by Konrad R.K. Ludwig.
+#
+#     This file is part of PodBlast.
+#
+#     PodBlast is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#     PodBlast is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#   along with PodBlast. If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------#
+
+import os
+from collections import OrderedDict
+import codec
+
+#------------------------------------------------------------------------------#
+#     The following class tracks the size and recency of downloaded media so
+#   the download cache can be held under a byte quota. The index is saved next
+#   to the database, so sizes never have to be read back from the files.
+#------------------------------------------------------------------------------#
+
+class MediaCache(object):
+    """
+    An index of downloaded media, ordered from least to most recently played,
+    with the owning feed url, episode PKID and size in bytes of each file.
+    'quota' is the maximum total size in bytes ('None' for no limit).
+    """
+    def __init__(self, quota = 2 * 1024 ** 3):
+        self.quota = quota
+        self.entries = OrderedDict()
+        self.total_size = 0
+        self.changed = False
+
+    # Adds (or replaces) a downloaded file as the most recently used:
+    def add(self, media_url, feed_url, episode_pkid, size):
+        self.remove(media_url)
+        self.entries[media_url] = [feed_url, episode_pkid, size]
+        self.total_size += size
+        self.changed = True
+
+    # Removes a file from the index:
+    def remove(self, media_url):
+        entry = self.entries.pop(media_url, None)
+        if entry:
+            self.total_size -= entry[2]
+            self.changed = True
+
+    # Marks a file as the most recently played:
+    def touch(self, media_url):
+        if media_url in self.entries:
+            self.entries.move_to_end(media_url)
+            self.changed = True
+
+    # Removes the least recently played files until the cache fits its quota,
+    # skipping 'protected' urls. Returns the removed '(media_url, feed_url,
+    # episode_pkid)' entries so their files can be deleted:
+    def evict(self, protected = ()):
+        evicted = []
+        if self.quota == None:
+            return evicted
+        for media_url, entry in list(self.entries.items()):
+            if self.total_size <= self.quota:
+                break
+            if media_url not in protected:
+                self.remove(media_url)
+                evicted.append((media_url, entry[0], entry[1]))
+        return evicted
+
+    # Loads the index from a file (an unreadable index starts empty):
+    def load(self, file_path):
+        self.entries = OrderedDict()
+        self.total_size = 0
+        try:
+            with open(file_path, 'r') as index_file:
+                for media_url, feed_url, episode_pkid, size in codec.loads(
+                    index_file.read()):
+                    self.entries[media_url] = [feed_url, episode_pkid, size]
+                    self.total_size += size
+        except FileNotFoundError:
+            pass
+        except:
+            print ('MediaCache:\tFailed to read media index: ' + file_path)
+        self.changed = False
+
+    # Atomically saves the index to a file if it has changed (or is new):
+    def save(self, file_path, force = False):
+        if not self.changed and not force:
+            return
+        temp_path = file_path + '.tmp'
+        with open(temp_path, 'w') as index_file:
+            index_file.write(codec.dumps([[media_url] + entry
+                for media_url, entry in self.entries.items()]))
+        os.replace(temp_path, file_path)
+        self.changed = False
@@ -0,0 +1,64 @@
+#------------------------------------------------------------------------------#
+#
+#     Copyright 2014 by Konrad R.K. Ludwig.
+#
+#     This file is part of PodBlast.
+#
+#     PodBlast is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#     PodBlast is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#   along with PodBlast. If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------#
+
+import os
+from xml.etree import ElementTree
+from xml.sax.saxutils import quoteattr
+
+#------------------------------------------------------------------------------#
+#     The following functions read and write subscription lists in 'OPML', the
+#   outline format other podcast players use to import and export feeds.
+#------------------------------------------------------------------------------#
+
+# Returns the feed urls listed in an 'OPML' file, in order. Outlines may be
+# nested in folders; any outline with an 'xmlUrl' attribute is a feed:
+def read_opml (file_path):
+    feed_urls = []
+    for event, element in ElementTree.iterparse(file_path):
+        if element.tag == 'outline':
+            feed_url = element.get('xmlUrl')
+            if feed_url:
+                feed_urls.append(feed_url.strip())
+        elif element.tag == 'body':
+            element.clear()
+    return feed_urls
+
+# Atomically writes feeds to an 'OPML' file, one outline at a time:
+def write_opml (file_path, feeds, title = 'PodBlast Subscriptions'):
+    temp_path = file_path + '.tmp'
+    with open(temp_path, 'w', encoding = 'utf-8') as opml_file:
+        opml_file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<opml version="2.0">\n'
+            '  <head>\n'
+            '    <title>' + escape_text(title) + '</title>\n'
+            '  </head>\n'
+            '  <body>\n')
+        for feed in feeds:
+            feed_title = feed.title or feed.url
+            opml_file.write('    <outline type="rss" text=' + quoteattr(feed_title)
+                + ' title=' + quoteattr(feed_title)
+                + ' xmlUrl=' + quoteattr(feed.url) + '/>\n')
+        opml_file.write('  </body>\n'
+            '</opml>\n')
+    os.replace(temp_path, file_path)
+
+def escape_text (text):
+    return quoteattr(text)[1:-1]
@@ -21,29 +21,79 @@
 
 import re
 import time
+import calendar
 import datetime
+from urllib.parse import urlsplit, urlunsplit
 
 #------------------------------------------------------------------------------#
-#     The following function "validates" a URL, returning a parsed and cleaned
-#   url string if the provided URL was valid or 'None' if it was bogus.
+#     The following functions "validate" URLs, returning a parsed and cleaned
+#   url string if the provided URL was valid or 'None' if it was bogus. The
+#   pattern is compiled once, when this module is imported.
 #------------------------------------------------------------------------------#
 
+# This regex string was shamelessly pulled from Django:
+REGEX_URL = re.compile(
+    r'^(?:http|ftp)s?://'  # http:// or https://
+    r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+(?:[A-Z]{2,6}\.?|[A-Z0-9-]{2,}\.?)|'  # domain...
+    r'localhost|'  # localhost...
+    r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}|'  # ...or ipv4
+    r'\[?[A-F0-9]*:[A-F0-9:]+\]?)'  # ...or ipv6
+    r'(?::\d+)?'  # optional port
+    r'(?:/?|[/?]\S+)$', re.IGNORECASE)
+
+# Ports which are left out of normalized urls:
+DEFAULT_PORTS = {'http' : 80, 'https' : 443, 'ftp' : 21, 'ftps' : 990}
+
 def validate_url (feed_url):
-    # This regex string was shamelessly pulled from Django:
-    regex_url = re.compile(
-        r'^(?:http|ftp)s?://'  # http:// or https://
-        r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+(?:[A-Z]{2,6}\.?|[A-Z0-9-]{2,}\.?)|'  # domain...
-        r'localhost|'  # localhost...
-        r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}|'  # ...or ipv4
-        r'\[?[A-F0-9]*:[A-F0-9:]+\]?)'  # ...or ipv6
-        r'(?::\d+)?'  # optional port
-        r'(?:/?|[/?]\S+)$', re.IGNORECASE)
-    feed_url = re.match(regex_url, feed_url)
+    feed_url = REGEX_URL.match(feed_url)
     if feed_url == None:
         return feed_url
     else:
         return feed_url.group(0)
 
+# Returns a url in a standard form so that equivalent urls compare equal: the
+# scheme and host are lower-cased, default ports are dropped and an empty path
+# becomes '/'. Returns 'None' if the url has an invalid port:
+def normalize_url (feed_url):
+    # Most urls are already normal, which is cheap to check without parsing:
+    scheme, separator, rest = feed_url.partition('://')
+    if separator and rest:
+        host, separator, path = rest.partition('/')
+        if (separator and scheme.islower() and host == host.lower()
+            and not any(char in host for char in ':@?#')):
+            return feed_url
+    parts = urlsplit(feed_url)
+    try:
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    host = parts.hostname or ''
+    if ':' in host:
+        host = '[' + host + ']'
+    netloc = parts.netloc.rpartition('@')
+    netloc = netloc[0] + netloc[1] + host
+    if port != None and port != DEFAULT_PORTS.get(scheme):
+        netloc += ':' + str(port)
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query,
+        parts.fragment))
+
+# Validates and normalizes many urls at once, returning the valid urls in
+# order with duplicates removed:
+def validate_urls (feed_urls):
+    valid_urls = []
+    seen = set()
+    match = REGEX_URL.match
+    for feed_url in feed_urls:
+        feed_url = match(feed_url.strip())
+        if feed_url == None:
+            continue
+        feed_url = normalize_url(feed_url.group(0))
+        if feed_url and feed_url not in seen:
+            seen.add(feed_url)
+            valid_urls.append(feed_url)
+    return valid_urls
+
 #------------------------------------------------------------------------------#
 #     The following two functions translate Python's 9-Tupile time format into
 #   or back from a dictionary object with 'JSON' can handle.
@@ -75,6 +125,70 @@ def unpack_time(timeinfo):
         timeinfo['tm_isdst']
         ])
 
+#------------------------------------------------------------------------------#
+#     The following two functions translate Python's 9-Tupile time format (in
+#   UTC, as parsed by 'feedparser') into or back from integer epoch seconds,
+#   passing 'None' through for episodes without a published date.
+#------------------------------------------------------------------------------#
+
+def time_to_epoch(timeinfo):
+    if timeinfo == None:
+        return None
+    return calendar.timegm(timeinfo)
+
+def epoch_to_time(epoch):
+    if epoch == None:
+        return None
+    return time.gmtime(epoch)
+
+# Converts a stored published time to epoch seconds. Databases written before
+# schema version 2 store the 9-key dictionary made by 'pack_time()':
+def unpack_epoch(timeinfo):
+    if isinstance(timeinfo, dict):
+        return calendar.timegm(unpack_time(timeinfo))
+    return timeinfo
+
+#------------------------------------------------------------------------------#
+#     The following class packs a list of boolean flags into the bits of a
+#   'bytearray', using one bit per flag instead of one object reference.
+#------------------------------------------------------------------------------#
+
+class FlagArray(object):
+    """
+    A compact, growable array of boolean flags.
+    """
+    __slots__ = ('bits', 'length')
+
+    def __init__(self):
+        self.bits = bytearray()
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if index < 0 or index >= self.length:
+            raise IndexError('FlagArray index out of range')
+        return bool(self.bits[index >> 3] & (1 << (index & 7)))
+
+    def __setitem__(self, index, value):
+        if index < 0 or index >= self.length:
+            raise IndexError('FlagArray index out of range')
+        if value:
+            self.bits[index >> 3] |= 1 << (index & 7)
+        else:
+            self.bits[index >> 3] &= ~(1 << (index & 7))
+
+    def append(self, value):
+        if self.length & 7 == 0:
+            self.bits.append(0)
+        self.length += 1
+        self[self.length - 1] = value
+
+    # Returns the number of flags which are set:
+    def count(self):
+        return sum(bin(byte).count('1') for byte in self.bits)
+
 #------------------------------------------------------------------------------#
 #     The following function converts time given in raw seconds to a formatted
 #   time object.
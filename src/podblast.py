@@ -21,7 +21,6 @@
 
 import database
 import stream
-import gtkhandler
 
 #------------------------------------------------------------------------------#
 
@@ -29,19 +28,64 @@ class PodBlast (database.Database):
     """
     The primary PodBlast class with all of the necessary implementatons to fetch
     data from a remote feed, save/load data using JSON, and set/control a
-    streaming audio channel.
+    streaming audio channel. 'audio_sink' names the stream's output (see
+    'stream.make_audio_sink()'), eg: 'fake' to run without sound hardware.
     """
-    def __init__(self):
+    def __init__(self, audio_sink = 'pulse'):
         print ('Initializing PodBlast...')
         # Defines state trackers:
         self.actv_feed_pkid = None
         self.actv_epsd_pkid = None
 
+        # Defines auto-advance settings. Plays on into the next episode when
+        # the current one ends (streaming it unless it has been downloaded).
+        # With 'prefetch_next' set the whole next episode is also downloaded
+        # in the background while the download cache is under its quota, so
+        # it starts without a network wait:
+        self.auto_advance = True
+        self.prefetch_next = False
+        # Called when playback moves on to the next episode or reaches the
+        # end of the feed, and the function used to handle finished
+        # prefetches on the main loop (eg: 'GObject.idle_add'):
+        self.advance_callback = None
+        self.dispatch = None
+
+        # Defines resume tracking. 'playing_media' is the media url of the
+        # episode on the stream, whose position is checkpointed every
+        # 'checkpoint_interval' seconds. Positions within 'finished_margin'
+        # seconds of the end count as finished and are forgotten:
+        self.playing_media = None
+        self.checkpoint_interval = 10
+        self.finished_margin = 15
+
+        # Defines the seconds of silence trimmed from each episode (by media
+        # url) and in total since starting:
+        self.time_saved = {}
+        self.total_time_saved = 0.0
+
         # Calls parent class constructor:
         database.Database.__init__(self)
 
         # Instantiates 'Stream' component object:
-        self.stream = stream.Stream()
+        self.stream = stream.Stream(audio_sink)
+        self.stream.advance_callback = self.on_stream_advanced
+        self.stream.error_callback = self.on_stream_error
+
+    # Keeps the active feed's episodes loaded:
+    def is_feed_active (self, feed):
+        return (self.actv_feed_pkid != None
+            and self.actv_feed_pkid < len(self.feeds)
+            and self.feeds[self.actv_feed_pkid] is feed)
+
+    # Keeps the playing episode's download:
+    def get_active_episodes (self):
+        if (self.actv_feed_pkid == None or self.actv_epsd_pkid == None
+            or self.actv_feed_pkid >= len(self.feeds)):
+            return []
+        feed = self.feeds[self.actv_feed_pkid]
+        if self.actv_epsd_pkid >= feed.get_episode_count():
+            return []
+        return [feed.episodes[self.actv_epsd_pkid]]
 
     #---------------- ----- --- --- - - - -  -     -
     # Stream controls:
@@ -61,6 +105,7 @@ class PodBlast (database.Database):
                     print ('PodBlast:\tEpisode index out of range.')
                 else:
                     print ('PodBlast:\tSetting new PKID pair: [', feed_pkid, ', ', epsd_pkid, ']')
+                    self.touch_feed(self.feeds[feed_pkid])
                     self.actv_feed_pkid = feed_pkid
                     self.actv_epsd_pkid = epsd_pkid
                     if (epsd_pkid != None
@@ -76,31 +121,129 @@ class PodBlast (database.Database):
     # Stops the current stream, gets the desired URL based on the "state
     # tracker" and passes that url to the player:
     def reset(self):
+        self.record_position()
+        self.record_time_saved()
         self.stream.stop()
+        self.playing_media = None
         if (self.actv_feed_pkid != None
             and self.actv_epsd_pkid != None):
             feed = self.feeds[self.actv_feed_pkid]
             episode = feed.episodes[self.actv_epsd_pkid]
-            media_url = episode.media[0]
+            # Prefers a downloaded copy over streaming the remote media:
+            media_url = self.get_local_uri(episode)
+            if media_url:
+                self.media_cache.touch(episode.media[0])
+            else:
+                if episode.downloaded:
+                    self.set_downloaded(feed, self.actv_epsd_pkid, False)
+                    self.media_cache.remove(episode.media[0])
+                media_url = episode.media[0]
+            self.stream.set_trim_silence(feed.trim_silence)
             self.stream.set(media_url)
+            self.stream.set_rate(feed.playback_rate)
+            # Starts where the episode was left, once the stream prerolls:
+            self.playing_media = episode.media[0]
+            self.stream.seek_on_preroll(
+                self.resume_positions.get(self.playing_media))
+            self.prepare_next()
+
+    # Returns the PKID of the episode after the active one, or 'None':
+    def get_next_pkid (self):
+        if (self.actv_feed_pkid == None or self.actv_epsd_pkid == None
+            or self.actv_feed_pkid >= len(self.feeds)):
+            return None
+        next_pkid = self.actv_epsd_pkid + 1
+        if next_pkid < self.feeds[self.actv_feed_pkid].get_episode_count():
+            return next_pkid
+
+    # Queues the next episode on the stream so it plays on without a gap,
+    # starting a background download of it if prefetching is on:
+    def prepare_next (self):
+        next_pkid = self.get_next_pkid()
+        if not self.auto_advance or next_pkid == None:
+            self.stream.set_next(None)
+            return
+        episode = self.feeds[self.actv_feed_pkid].episodes[next_pkid]
+        if not episode.media:
+            self.stream.set_next(None)
+            return
+        media_url = self.get_local_uri(episode)
+        if not media_url:
+            media_url = episode.media[0]
+            if self.prefetch_next and self.can_prefetch():
+                self.download_episode(self.actv_feed_pkid, next_pkid,
+                    self.on_next_downloaded, self.dispatch)
+        self.stream.set_next(media_url)
+
+    # Returns 'True' if the download cache has room for a prefetch (one that
+    # would push it over its quota only evicts episodes to be played again):
+    def can_prefetch (self):
+        return (self.media_cache.quota == None
+            or self.media_cache.total_size < self.media_cache.quota)
+
+    # Swaps the queued episode for its local copy once prefetched:
+    def on_next_downloaded (self, feed_url, episode_pkid, success):
+        if (success
+            and episode_pkid == self.get_next_pkid()
+            and self.feeds[self.actv_feed_pkid].url == feed_url):
+            self.prepare_next()
+
+    # Follows the stream onto the next episode, or stops at the end:
+    def on_stream_advanced (self, media_url):
+        # The previous episode played to the end:
+        self.record_time_saved()
+        if self.playing_media:
+            self.resume_positions.set(self.playing_media, None)
+            self.playing_media = None
+        if media_url == None or self.get_next_pkid() == None:
+            print ('PodBlast:\tReached the end of the current playlist.')
+            self.stop()
+        else:
+            self.actv_epsd_pkid = self.get_next_pkid()
+            print ('PodBlast:\tAdvanced to episode #' + str(self.actv_epsd_pkid))
+            episode = self.feeds[self.actv_feed_pkid].episodes[self.actv_epsd_pkid]
+            self.playing_media = episode.media[0]
+            self.media_cache.touch(episode.media[0])
+            if episode.is_new:
+                self.mark_old(self.actv_feed_pkid, self.actv_epsd_pkid)
+            self.prepare_next()
+        if self.advance_callback:
+            self.advance_callback()
+
+    # Stops when the stream fails (eg: the media cannot be reached), keeping
+    # the episode's resume position, and reports it like reaching the end:
+    def on_stream_error (self, message):
+        print ('PodBlast:\tPlayback failed: ' + message)
+        self.stop()
+        if self.advance_callback:
+            self.advance_callback()
+
+    # Turns auto-advance on or off:
+    def set_auto_advance (self, auto_advance):
+        self.auto_advance = auto_advance
+        if self.actv_epsd_pkid != None:
+            self.prepare_next()
 
     # Pauses or plays GStreamer playback based on the current player state:
     def play_pause (self):
         if self.stream.player_state is not 'PLAYING':
             self.stream.play()
         else:
+            self.record_position()
             self.stream.pause()
 
     # Stops GStreamer playback and sets the episode tracker to "None":
     def stop (self):
+        self.record_position()
+        self.record_time_saved()
         self.stream.stop()
         self.set(self.actv_feed_pkid, None)
 
     # Starts playing the "next" episode in the feed:
     def next (self):
-        max_pkid = len(self.feeds[self.actv_feed_pkid].episodes)
-        if self.actv_epsd_pkid < max_pkid:
-            self.actv_epsd_pkid += 1
+        next_pkid = self.get_next_pkid()
+        if next_pkid != None:
+            self.actv_epsd_pkid = next_pkid
             self.reset()
             self.play_pause()
         else:
@@ -125,6 +268,9 @@ class PodBlast (database.Database):
 
     # Nullifies the stream (for thread-safe quitting):
     def null (self):
+        self.record_position()
+        self.record_time_saved()
+        self.playing_media = None
         self.set(None, None)
         self.stream.null()
 
@@ -142,10 +288,95 @@ class PodBlast (database.Database):
     def get_player_state (self):
         return self.stream.player_state
 
+    # Gets the duration of the current stream (in seconds):
+    def get_duration (self):
+        return self.stream.get_duration()
+
     # Gets the current stream position (in seconds):
     def get_position (self):
         return self.stream.get_position()
 
-    # Sets the current stream position (in seconds):
-    def set_position (self, raw_seconds):
-        self.stream.set_position(raw_seconds)
\ No newline at end of file
+    # Returns the playback rate (the active feed's, if a feed is active):
+    def get_rate (self):
+        if self.actv_feed_pkid != None:
+            return self.feeds[self.actv_feed_pkid].playback_rate
+        return self.stream.rate
+
+    # Sets the playback rate, remembering it for the active feed:
+    def set_rate (self, rate):
+        self.stream.set_rate(rate)
+        if self.actv_feed_pkid != None:
+            self.set_feed_rate(self.feeds[self.actv_feed_pkid],
+                self.stream.rate)
+
+    # Sets the current stream position (in seconds). Inaccurate seeks jump to
+    # the nearest keyframe, which is faster (eg: while dragging a slider):
+    def set_position (self, raw_seconds, accurate = True):
+        self.stream.set_position(raw_seconds, accurate)
+
+    #---------------- ----- --- --- - - - -  -     -
+    # Resume positions:
+
+    # Remembers the position of the episode on the stream (in memory only).
+    # While a seek is pending (eg: to a saved position) its target counts as
+    # the position, so a resume is never overwritten with the start:
+    def record_position (self):
+        if (not self.playing_media
+            or self.stream.player_state not in ('PLAYING', 'PAUSED')):
+            return
+        position = self.stream.query_position()
+        if position == None:
+            return
+        duration = self.stream.get_duration()
+        if position < 1 or (duration
+            and position > duration - self.finished_margin):
+            position = None
+        self.resume_positions.set(self.playing_media, position)
+
+    # Records the current position and appends any changed positions to disk.
+    # Called every 'checkpoint_interval' seconds; costs the same however many
+    # positions are stored:
+    def checkpoint (self):
+        self.record_position()
+        self.save_positions()
+
+    #---------------- ----- --- --- - - - -  -     -
+    # Silence trimming:
+
+    # Turns silence trimming on or off for the active feed. A playing episode
+    # of that feed is restarted from its current position to apply it:
+    def set_trim_silence (self, trim_silence):
+        if self.actv_feed_pkid == None:
+            return
+        self.set_feed_trim_silence(self.feeds[self.actv_feed_pkid],
+            trim_silence)
+        self.stream.set_trim_silence(trim_silence)
+        if self.actv_epsd_pkid != None:
+            playing = self.stream.player_state == 'PLAYING'
+            self.reset()
+            if playing:
+                self.stream.play()
+
+    # Returns whether silence is trimmed from the active feed's episodes:
+    def get_trim_silence (self):
+        if self.actv_feed_pkid != None:
+            return self.feeds[self.actv_feed_pkid].trim_silence
+        return False
+
+    # Adds the silence trimmed by the stream to the episode on it:
+    def record_time_saved (self):
+        trimmed_time = self.stream.take_trimmed_time()
+        if trimmed_time and self.playing_media:
+            self.time_saved[self.playing_media] = (
+                self.time_saved.get(self.playing_media, 0.0) + trimmed_time)
+            self.total_time_saved += trimmed_time
+            print ('PodBlast:\tTrimmed ' + '%.1f' % self.time_saved[
+                self.playing_media] + ' s of silence from "'
+                + self.playing_media + '"')
+
+    # Returns the seconds of silence trimmed from the episode on the stream:
+    def get_time_saved (self):
+        if not self.playing_media:
+            return 0.0
+        return (self.time_saved.get(self.playing_media, 0.0)
+            + self.stream.get_trimmed_time())
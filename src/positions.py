@@ -0,0 +1,114 @@
+#------------------------------------------------------------------------------#
+#
+#     Copyright 2014 by Konrad R.K. Ludwig.
+#
+#     This file is part of PodBlast.
+#
+#     PodBlast is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#     PodBlast is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#   along with PodBlast. If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------#
+
+import os
+import codec
+
+#------------------------------------------------------------------------------#
+#     The following class keeps the position each episode was left at so it
+#   can be resumed later. Positions change every few seconds while playing, so
+#   they are kept apart from the database: changes collect in memory and each
+#   flush appends only the positions changed since the last one as a single
+#   line, no matter how many positions are stored.
+#------------------------------------------------------------------------------#
+
+class PositionStore(object):
+    """
+    Resume positions (in seconds) keyed by episode media url. The file is a
+    list of lines, each a 'JSON' object of changed positions ('None' where a
+    position was cleared), applied in order. Once there are more lines than
+    'compact_after' (or than stored positions, if more) the file is rewritten
+    as a single line.
+    """
+    def __init__(self, compact_after = 1000):
+        self.compact_after = compact_after
+        self.positions = {}
+        self.changes = {}
+        self.file_path = None
+        self.line_count = 0
+
+    # Returns the saved position of an episode, or 'None':
+    def get(self, media_url):
+        return self.positions.get(media_url)
+
+    # Saves the position of an episode in memory ('None' clears it):
+    def set(self, media_url, position):
+        if position != None:
+            position = round(position, 1)
+        if self.positions.get(media_url) == position:
+            return
+        if position == None:
+            del self.positions[media_url]
+        else:
+            self.positions[media_url] = position
+        self.changes[media_url] = position
+
+    # Loads positions from a file (an unreadable file starts empty), ignoring
+    # a partially written final line:
+    def load(self, file_path):
+        self.positions = {}
+        self.changes = {}
+        self.file_path = file_path
+        self.line_count = 0
+        try:
+            with open(file_path, 'r') as positions_file:
+                for line in positions_file:
+                    try:
+                        changes = codec.loads(line)
+                    except ValueError:
+                        break
+                    for media_url, position in changes.items():
+                        if position == None:
+                            self.positions.pop(media_url, None)
+                        else:
+                            self.positions[media_url] = position
+                    self.line_count += 1
+        except FileNotFoundError:
+            pass
+        except:
+            print ('PositionStore:\tFailed to read positions: ' + file_path)
+        if self.line_count > 1:
+            self.compact()
+
+    # Appends the changed positions to the file as one line. Lost positions
+    # are cheap to lose, so the file is not synced to disk:
+    def flush(self, file_path):
+        if file_path != self.file_path:
+            self.file_path = file_path
+            self.compact()
+            return
+        if not self.changes:
+            return
+        with open(file_path, 'a') as positions_file:
+            positions_file.write(codec.dumps(self.changes) + '\n')
+        self.changes = {}
+        self.line_count += 1
+        if self.line_count > max(self.compact_after, len(self.positions)):
+            self.compact()
+
+    # Atomically rewrites the file as a single line of every position:
+    def compact(self):
+        temp_path = self.file_path + '.tmp'
+        with open(temp_path, 'w') as positions_file:
+            positions_file.write(codec.dumps(self.positions) + '\n')
+        os.replace(temp_path, self.file_path)
+        self.changes = {}
+        self.line_count = 1
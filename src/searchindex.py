@@ -0,0 +1,236 @@
+#------------------------------------------------------------------------------#
+#
+#     Copyright 2014 by Konrad R.K. Ludwig.
+#
+#     This file is part of PodBlast.
+#
+#     PodBlast is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#     PodBlast is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#   along with PodBlast. If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------#
+
+import re
+import math
+import html
+import heapq
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+#------------------------------------------------------------------------------#
+#     The following functions turn episode text into search tokens: markup is
+#   stripped, entities are decoded and the remaining words are lower-cased.
+#------------------------------------------------------------------------------#
+
+TAG = re.compile(r'<[^>]*>')
+WORD = re.compile(r'\w+')
+
+def strip_html (text):
+    if not text:
+        return ''
+    if '<' in text:
+        text = TAG.sub(' ', text)
+    if '&' in text:
+        text = html.unescape(text)
+    return text
+
+def tokenize (text):
+    return WORD.findall(strip_html(text).lower())
+
+#------------------------------------------------------------------------------#
+#     The following class is an inverted index over episode titles and
+#   descriptions. Each indexed episode is a "document" numbered in the order
+#   it was added; each word maps to a compact array of the documents using it.
+#   Re-indexing an episode retires its old document rather than rewriting
+#   the arrays, so updates cost the same as additions.
+#------------------------------------------------------------------------------#
+
+TITLE_WEIGHT = 3.0
+DESCRIPTION_WEIGHT = 1.0
+# Words which only start with a query word count for less than exact matches:
+PREFIX_WEIGHT = 0.5
+# The cost of looking a document up in a word's postings, relative to adding
+# one posting to a table of scores:
+LOOKUP_COST = 8
+
+class SearchIndex(object):
+    """
+    Finds episodes by the words in their titles and descriptions. Documents
+    are keyed by '(feed_url, episode_pkid)'. Every query word must match
+    (exactly or as the start of a word) and results are ranked by how rare
+    the matched words are and whether they appear in the title.
+    """
+    def __init__(self):
+        # Defines the documents ('None' once retired) and the current document
+        # of each episode by feed url and PKID:
+        self.documents = []
+        self.feed_documents = {}
+        self.retired = set()
+        self.live_count = 0
+        # Defines the postings of each word and the sorted word list used for
+        # prefix matching (rebuilt when new words have been added):
+        self.title_postings = defaultdict(lambda: array('I'))
+        self.description_postings = defaultdict(lambda: array('I'))
+        self.words = []
+        self.words_changed = False
+
+    # Indexes (or re-indexes) an episode's text:
+    def add(self, feed_url, episode_pkid, title, description):
+        self.remove(feed_url, episode_pkid)
+        document = len(self.documents)
+        self.documents.append((feed_url, episode_pkid))
+        self.feed_documents.setdefault(feed_url, {})[episode_pkid] = document
+        self.live_count += 1
+        self.add_postings(self.title_postings, document, tokenize(title))
+        self.add_postings(self.description_postings, document,
+            tokenize(description))
+
+    def add_postings(self, postings, document, words):
+        word_count = len(postings)
+        for word in set(words):
+            postings[word].append(document)
+        if len(postings) != word_count:
+            self.words_changed = True
+
+    # Retires an episode's document:
+    def remove(self, feed_url, episode_pkid):
+        documents = self.feed_documents.get(feed_url)
+        if documents and episode_pkid in documents:
+            self.retire(documents.pop(episode_pkid))
+
+    # Retires every document of a feed:
+    def remove_feed(self, feed_url):
+        for document in self.feed_documents.pop(feed_url, {}).values():
+            self.retire(document)
+
+    def retire(self, document):
+        self.documents[document] = None
+        self.retired.add(document)
+        self.live_count -= 1
+
+    # Rebuilds the sorted word list if new words have been added:
+    def sort_words(self):
+        if self.words_changed:
+            self.words = sorted(set(self.title_postings)
+                | set(self.description_postings))
+            self.words_changed = False
+
+    # Returns the indexed words starting with 'prefix':
+    def get_prefixed_words(self, prefix):
+        self.sort_words()
+        start = bisect_left(self.words, prefix)
+        end = bisect_left(self.words, prefix + '\uffff', start)
+        return self.words[start:end]
+
+    # Returns the '(score, documents)' pairs of a query word, one for each
+    # field of each indexed word it matches:
+    def get_matches(self, query_word):
+        matches = []
+        for word in self.get_prefixed_words(query_word):
+            weight = 1.0 if word == query_word else PREFIX_WEIGHT
+            for postings, field_weight in (
+                (self.title_postings, TITLE_WEIGHT),
+                (self.description_postings, DESCRIPTION_WEIGHT)):
+                documents = postings.get(word)
+                if documents:
+                    rarity = math.log(1.0 + self.live_count / len(documents))
+                    matches.append((weight * field_weight * rarity, documents))
+        return matches
+
+    # Returns a dictionary of scores for the documents matching a query word
+    # (a document's best match counts, so the postings are applied from the
+    # lowest score to the highest):
+    def score_matches(self, matches):
+        matches = sorted(matches, key = lambda match: match[0])
+        scores = {}
+        for score, documents in matches:
+            scores.update(dict.fromkeys(documents, score))
+        return scores
+
+    # Adds the scores of a query word's matches to the totals of the candidate
+    # documents, dropping candidates it does not match. When there are few
+    # candidates next to the word's postings (eg: a common word after a rare
+    # one, or a search within one feed), each candidate is looked up in the
+    # sorted postings instead of scoring every document using the word:
+    def add_scores(self, totals, matches):
+        postings_count = sum([len(documents) for score, documents in matches])
+        if postings_count <= len(totals) * len(matches) * LOOKUP_COST:
+            scores = self.score_matches(matches)
+            return dict((document, total + scores[document])
+                for document, total in totals.items() if document in scores)
+        matches = sorted(matches, key = lambda match: match[0], reverse = True)
+        results = {}
+        for document, total in totals.items():
+            for score, documents in matches:
+                position = bisect_left(documents, document)
+                if position < len(documents) and documents[position] == document:
+                    results[document] = total + score
+                    break
+        return results
+
+    # Returns the 'limit' best (then newest) current documents matching a
+    # single query word without scoring the rest. Matches are taken from the
+    # highest score down, each newest document first, so a document is always
+    # reached first through its best match:
+    def get_top_documents(self, matches, limit):
+        groups = {}
+        for score, documents in matches:
+            groups.setdefault(score, []).append(documents)
+        results = []
+        selected = set()
+        for score in sorted(groups, reverse = True):
+            for document in heapq.merge(*[reversed(documents)
+                for documents in groups[score]], reverse = True):
+                if document in selected or document in self.retired:
+                    continue
+                selected.add(document)
+                results.append(document)
+                if len(results) == limit:
+                    return results
+        return results
+
+    # Returns '(feed_url, episode_pkid)' pairs matching every word of a query,
+    # best match first (newest first among equals). 'feed_url' limits the
+    # results to one feed and 'limit' caps their number:
+    def search(self, query, feed_url = None, limit = None):
+        word_matches = [self.get_matches(query_word)
+            for query_word in set(tokenize(query))]
+        if not word_matches:
+            return []
+        # Applies the rarest words first, so there are fewer candidates left
+        # for the common ones:
+        word_matches.sort(key = lambda matches:
+            sum([len(documents) for score, documents in matches]))
+        if feed_url != None:
+            # Starts from the current documents of the feed:
+            totals = dict.fromkeys(
+                self.feed_documents.get(feed_url, {}).values(), 0.0)
+        elif len(word_matches) == 1 and limit != None:
+            return [self.documents[document] for document
+                in self.get_top_documents(word_matches[0], limit)]
+        else:
+            totals = self.score_matches(word_matches.pop(0))
+            for document in self.retired:
+                totals.pop(document, None)
+        for matches in word_matches:
+            if not totals:
+                return []
+            totals = self.add_scores(totals, matches)
+        # Newest first, so equal scores rarely displace heap entries:
+        ranked = zip(reversed(totals.values()), reversed(totals.keys()))
+        # Ranks by score, then by document number (newer episodes first):
+        if limit != None:
+            ranked = heapq.nlargest(limit, ranked)
+        else:
+            ranked = sorted(ranked, reverse = True)
+        return [self.documents[document] for total, document in ranked]
@@ -0,0 +1,295 @@
+#------------------------------------------------------------------------------#
+#
+#     Copyright 2014 by Konrad R.K. Ludwig.
+#
+#     This file is part of PodBlast.
+#
+#     PodBlast is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#     PodBlast is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#   along with PodBlast. If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------#
+
+import sys
+import sqlite3
+import codec
+from pbutils import unpack_epoch
+from storage import JSONStorage, JournalStorage
+
+#------------------------------------------------------------------------------#
+#     The following class stores feeds and episodes in an 'SQLite' database.
+#   Every change reported by 'Database' becomes a small 'UPDATE' or 'INSERT',
+#   and a feed's episodes are only read when that feed is first opened.
+#------------------------------------------------------------------------------#
+
+SQLITE_EXTENSIONS = ('.sqlite', '.sqlite3', '.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS feeds (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    title TEXT,
+    description TEXT,
+    valid INTEGER NOT NULL DEFAULT 1,
+    etag TEXT,
+    modified TEXT,
+    content_hash TEXT
+);
+CREATE TABLE IF NOT EXISTS episodes (
+    feed_id INTEGER NOT NULL REFERENCES feeds (id),
+    pkid INTEGER NOT NULL,
+    guid TEXT,
+    url TEXT,
+    title TEXT,
+    description TEXT,
+    published INTEGER,
+    media TEXT NOT NULL,
+    downloaded INTEGER NOT NULL DEFAULT 0,
+    is_new INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (feed_id, pkid)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS feeds_url ON feeds (url);
+CREATE INDEX IF NOT EXISTS episodes_guid ON episodes (guid);
+CREATE INDEX IF NOT EXISTS episodes_published ON episodes (published);
+CREATE INDEX IF NOT EXISTS episodes_is_new ON episodes (feed_id, is_new);
+"""
+
+# Per-feed listening settings, added as columns to databases created before
+# they existed:
+FEED_SETTINGS = (
+    ('playback_rate', 'REAL NOT NULL DEFAULT 1.0'),
+    ('trim_silence', 'INTEGER NOT NULL DEFAULT 0'),
+    )
+
+FEED_ID = '(SELECT id FROM feeds WHERE url = ?)'
+
+# Returns 'True' if a database file should be opened with 'SQLiteStorage':
+def is_sqlite_path (file_path):
+    return file_path.lower().endswith(SQLITE_EXTENSIONS)
+
+# Converts an episode cache into an 'episodes' table row:
+def pack_episode (feed_url, episode_pkid, episode_cache):
+    return (
+        feed_url,
+        episode_pkid,
+        episode_cache.get('guid'),
+        episode_cache['url'],
+        episode_cache['title'],
+        episode_cache['description'],
+        unpack_epoch(episode_cache['dtg_published']),
+        codec.dumps(episode_cache['media']),
+        episode_cache['downloaded'],
+        episode_cache['is_new']
+        )
+
+# Converts an 'episodes' table row back into an episode cache:
+def unpack_episode (row):
+    guid, url, title, description, published, media, downloaded, is_new = row
+    return {
+        'guid' : guid,
+        'url' : url,
+        'title' : title,
+        'description' : description,
+        'media' : codec.loads(media),
+        'dtg_published' : published,
+        'downloaded' : bool(downloaded),
+        'is_new' : bool(is_new)
+        }
+
+
+class SQLiteStorage(JSONStorage):
+    """
+    Saves and loads PodBlast's data using an indexed 'SQLite' database in
+    write-ahead-log mode. Changes are written as they are recorded and
+    committed on save.
+    """
+    def __init__(self):
+        JSONStorage.__init__(self)
+        self.connection = None
+        self.reloads_episodes = True
+
+    # Opens (and if needed creates) the database at 'file_path'. The current
+    # connection is only closed once the new file has been opened and
+    # checked, so it stays usable if the new file cannot be:
+    def connect(self, file_path):
+        connection = sqlite3.connect(file_path)
+        try:
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            connection.executescript(SCHEMA)
+            self.add_setting_columns(connection)
+        except:
+            connection.close()
+            raise
+        if self.connection:
+            self.connection.close()
+        self.connection = connection
+        self.file_path = file_path
+
+    def add_setting_columns(self, connection):
+        columns = [row[1] for row in
+            connection.execute('PRAGMA table_info(feeds)')]
+        for name, definition in FEED_SETTINGS:
+            if name not in columns:
+                connection.execute(
+                    'ALTER TABLE feeds ADD COLUMN ' + name + ' ' + definition)
+
+    # Returns feed caches without their episode lists, which are loaded on
+    # demand by 'load_episodes()':
+    def load(self, file_path):
+        self.connect(file_path)
+        data_cache = []
+        for row in self.connection.execute(
+            'SELECT feeds.url, feeds.title, feeds.description, valid, etag, '
+            'modified, content_hash, playback_rate, trim_silence, '
+            'COUNT(pkid), TOTAL(is_new) FROM feeds '
+            'LEFT JOIN episodes ON episodes.feed_id = feeds.id '
+            'GROUP BY feeds.id ORDER BY feeds.id'):
+            (url, title, description, valid, etag, modified, content_hash,
+                playback_rate, trim_silence, episode_count, unread_count) = row
+            data_cache.append({
+                'url' : url,
+                'title' : title,
+                'description' : description,
+                'valid' : bool(valid),
+                'etag' : etag,
+                'modified' : modified,
+                'content_hash' : content_hash,
+                'playback_rate' : playback_rate,
+                'trim_silence' : bool(trim_silence),
+                'episode_count' : episode_count,
+                'unread_count' : int(unread_count)
+                })
+        return data_cache
+
+    # Returns the list of episode caches for a single feed (changes recorded
+    # since the last commit are included, so unloaded feeds lose nothing):
+    def load_episodes(self, feed_url):
+        return [unpack_episode(row) for row in self.connection.execute(
+            'SELECT guid, url, title, description, published, media, '
+            'downloaded, is_new FROM episodes WHERE feed_id = ' + FEED_ID +
+            ' ORDER BY pkid', (feed_url,))]
+
+    # Commits recorded changes, or writes every feed if saving to a different
+    # file than the one loaded:
+    def save(self, database, file_path):
+        if file_path != self.file_path:
+            # Caches every feed before switching files, since feeds which have
+            # not been opened yet still load their episodes from this one:
+            data_cache = [feed.gen_cache()
+                for feed in database.feeds if feed.valid]
+            self.connect(file_path)
+            self.connection.execute('DELETE FROM episodes')
+            self.connection.execute('DELETE FROM feeds')
+            for feed_cache in data_cache:
+                self.insert_feed(feed_cache)
+        self.connection.commit()
+
+    def reset(self):
+        if self.connection:
+            self.connection.close()
+        self.connection = None
+        JSONStorage.reset(self)
+
+    # Inserts a feed cache (and all of its episodes):
+    def insert_feed(self, feed_cache):
+        self.connection.execute(
+            'INSERT INTO feeds (url, title, description, valid, etag, '
+            'modified, content_hash, playback_rate, trim_silence) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+                feed_cache['url'],
+                feed_cache['title'],
+                feed_cache['description'],
+                feed_cache['valid'],
+                feed_cache.get('etag'),
+                feed_cache.get('modified'),
+                feed_cache.get('content_hash'),
+                feed_cache.get('playback_rate', 1.0),
+                feed_cache.get('trim_silence', False)
+                ))
+        self.replace_episodes(feed_cache['url'],
+            enumerate(feed_cache['episodes']))
+
+    # Inserts or replaces episode rows from '(pkid, episode_cache)' pairs:
+    def replace_episodes(self, feed_url, episode_caches):
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO episodes (feed_id, pkid, guid, url, '
+            'title, description, published, media, downloaded, is_new) '
+            'VALUES (' + FEED_ID + ', ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [pack_episode(feed_url, episode_pkid, episode_cache)
+                for episode_pkid, episode_cache in episode_caches])
+
+    # Change hooks:
+
+    def record_register(self, feed):
+        if self.connection:
+            self.insert_feed(feed.gen_cache())
+
+    def record_delete(self, feed_url):
+        if self.connection:
+            self.connection.execute(
+                'DELETE FROM episodes WHERE feed_id = ' + FEED_ID, (feed_url,))
+            self.connection.execute(
+                'DELETE FROM feeds WHERE url = ?', (feed_url,))
+
+    def record_feed(self, feed):
+        if self.connection:
+            self.connection.execute(
+                'UPDATE feeds SET title = ?, description = ?, valid = ?, '
+                'etag = ?, modified = ?, content_hash = ?, playback_rate = ?, '
+                'trim_silence = ? WHERE url = ?', (
+                    feed.title,
+                    feed.description,
+                    feed.valid,
+                    feed.etag,
+                    feed.modified,
+                    feed.content_hash,
+                    feed.playback_rate,
+                    feed.trim_silence,
+                    feed.url
+                    ))
+
+    def record_mark_old(self, feed_url, episode_pkid):
+        if self.connection:
+            self.connection.execute(
+                'UPDATE episodes SET is_new = 0 WHERE feed_id = ' + FEED_ID +
+                ' AND pkid = ?', (feed_url, episode_pkid))
+
+    def record_episodes(self, feed, episode_pkids):
+        if self.connection:
+            self.replace_episodes(feed.url, [
+                (episode_pkid, feed.episodes[episode_pkid].gen_cache())
+                for episode_pkid in episode_pkids])
+
+#------------------------------------------------------------------------------#
+#     The following function is a one-shot migrator which copies a 'JSON'
+#   database (and any journaled changes) into a new 'SQLite' database.
+#------------------------------------------------------------------------------#
+
+def migrate (json_path, sqlite_path):
+    print ('SQLiteStorage:\tMigrating ' + json_path + ' to ' + sqlite_path)
+    data_cache = JournalStorage().load(json_path)
+    storage = SQLiteStorage()
+    storage.connect(sqlite_path)
+    storage.connection.execute('DELETE FROM episodes')
+    storage.connection.execute('DELETE FROM feeds')
+    for feed_cache in data_cache:
+        if feed_cache['valid']:
+            storage.insert_feed(feed_cache)
+    storage.connection.commit()
+    storage.reset()
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print ('Usage: python3 src/sqlstore.py <json_database> <sqlite_database>')
+        sys.exit(1)
+    migrate(sys.argv[1], sys.argv[2])
@@ -0,0 +1,348 @@
+#------------------------------------------------------------------------------#
+#
+#     Copyright 2014 by Konrad R.K. Ludwig.
+#
+#     This file is part of PodBlast.
+#
+#     PodBlast is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#     PodBlast is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#   along with PodBlast. If not, see <http://www.gnu.org/licenses/>.
+#
+#------------------------------------------------------------------------------#
+
+import os
+import threading
+import codec
+
+#------------------------------------------------------------------------------#
+#     The following functions read and write database "snapshots", a 'JSON'
+#   document holding every feed and episode. Snapshots are written to a
+#   temporary file and renamed over the old one, so a crash mid-write never
+#   leaves a truncated database behind. Both directions work one feed at a
+#   time, so the whole database never has to exist as decoded 'JSON' data.
+#------------------------------------------------------------------------------#
+
+# Version 2 stores published times as integer epoch seconds (version 1 and
+# unversioned databases store 'pbutils.pack_time()' dictionaries):
+SNAPSHOT_VERSION = 2
+
+# Returns a tuple with the journal sequence number and the feed caches stored
+# in a snapshot file. If 'streaming' is set the feeds are an iterator which
+# decodes each feed as it is reached:
+def read_snapshot (file_path, streaming = True):
+    with open(file_path, 'r') as json_file:
+        text = json_file.read()
+    if not streaming:
+        snapshot = codec.loads(text)
+        # Databases written before versioning are a bare list of feeds:
+        if isinstance(snapshot, list):
+            return (0, snapshot)
+        return (snapshot['seq'], snapshot['feeds'])
+    index = codec.skip_whitespace(text, 0)
+    if text[index] == '[':
+        return (0, codec.iter_array(text, index))
+    header, feed_caches = codec.iter_object_array(text, index, 'feeds')
+    return (header.get('seq', 0), feed_caches)
+
+# Atomically replaces a snapshot file with new feed caches, encoding one feed
+# at a time. Each feed is written on a line of its own, so it can be decoded
+# with the fast codec when read back one feed at a time:
+def write_snapshot (file_path, seq, feed_caches):
+    temp_path = file_path + '.tmp'
+    with open(temp_path, 'w') as json_file:
+        json_file.write('{"version": ' + str(SNAPSHOT_VERSION)
+            + ', "seq": ' + str(seq) + ', "feeds": [\n')
+        separator = ''
+        for feed_cache in feed_caches:
+            json_file.write(separator + codec.dumps(feed_cache))
+            separator = ',\n'
+        json_file.write('\n]}')
+        json_file.flush()
+        os.fsync(json_file.fileno())
+    os.replace(temp_path, file_path)
+
+# Applies a journal record which changes an existing feed to its cache:
+def apply_feed_record (feed_cache, record):
+    operation = record['op']
+    if operation == 'feed':
+        feed_cache.update(record['feed'])
+    elif operation == 'mark_old':
+        feed_cache['episodes'][record['pkid']]['is_new'] = False
+    elif operation == 'episodes':
+        episodes = feed_cache['episodes']
+        for episode_pkid, episode_cache in record['episodes']:
+            if episode_pkid < len(episodes):
+                episodes[episode_pkid] = episode_cache
+            else:
+                episodes.append(episode_cache)
+
+# Applies a feed's journal records in order, returning its updated cache or
+# 'None' once a record deletes it:
+def apply_feed_records (feed_cache, records):
+    for record in records:
+        if record['op'] == 'delete':
+            return None
+        apply_feed_record(feed_cache, record)
+    return feed_cache
+
+# Yields feed caches with journal records newer than 'seq' replayed on top.
+# Records are grouped by feed, so each feed is updated as it streams past and
+# feeds registered in the journal follow at the end:
+def replay_journal (feed_caches, records, seq):
+    feed_records = {}
+    registrations = []
+    for record in records:
+        if record['seq'] <= seq:
+            continue
+        if record['op'] == 'register':
+            feed_url = record['feed']['url']
+            registrations.append(record)
+        else:
+            feed_url = record['url']
+        feed_records.setdefault(feed_url, []).append(record)
+    for feed_cache in feed_caches:
+        records = [record for record in feed_records.get(feed_cache['url'], [])
+            if record['op'] != 'register']
+        feed_cache = apply_feed_records(feed_cache, records)
+        if feed_cache != None:
+            yield feed_cache
+    for registration in registrations:
+        records = [record for record in feed_records[registration['feed']['url']]
+            if record['seq'] > registration['seq']]
+        feed_cache = apply_feed_records(registration['feed'], records)
+        if feed_cache != None:
+            yield feed_cache
+
+#------------------------------------------------------------------------------#
+#     The following two classes are the storage backends used by 'Database'.
+#   The database reports every change it makes through the 'record_*()' hooks
+#   so a backend can persist changes as they happen rather than on 'save()'.
+#------------------------------------------------------------------------------#
+
+class JSONStorage(object):
+    """
+    Saves and loads the whole database as a single 'JSON' snapshot file,
+    rewriting the file on every save.
+    """
+    def __init__(self):
+        self.file_path = None
+        # Snapshots cannot reload a single feed's episodes on demand:
+        self.reloads_episodes = False
+        # Decodes snapshots one feed at a time (set to 'False' to decode the
+        # whole file at once, which is faster but needs more memory):
+        self.streaming = True
+
+    # Returns the feed caches stored at 'file_path':
+    def load(self, file_path):
+        seq, feed_caches = read_snapshot(file_path, self.streaming)
+        self.file_path = file_path
+        return feed_caches
+
+    # Returns the list of episode caches for a feed loaded without episodes
+    # (snapshots always include them):
+    def load_episodes(self, feed_url):
+        return []
+
+    # Writes every valid feed to 'file_path':
+    def save(self, database, file_path):
+        feed_caches = (feed.gen_cache() for feed in database.feeds if feed.valid)
+        write_snapshot(file_path, 0, feed_caches)
+        self.file_path = file_path
+
+    # Forgets the current file (eg: after a new, empty database is created):
+    def reset(self):
+        self.file_path = None
+
+    # Returns a new backend of the same type and settings, with no file:
+    def new_instance(self):
+        storage = type(self)()
+        storage.streaming = self.streaming
+        return storage
+
+    # Blocks until any background writes have finished (there are none):
+    def wait(self):
+        pass
+
+    # Change hooks (the whole file is rewritten on save, so they do nothing):
+
+    def record_register(self, feed):
+        pass
+
+    def record_delete(self, feed_url):
+        pass
+
+    def record_feed(self, feed):
+        pass
+
+    def record_mark_old(self, feed_url, episode_pkid):
+        pass
+
+    def record_episodes(self, feed, episode_pkids):
+        pass
+
+
+class JournalStorage(JSONStorage):
+    """
+    Appends small change records to a journal next to the database snapshot
+    so saving costs time proportional to the number of changes. Once the
+    journal grows past 'compact_after' records it is folded into a new
+    snapshot on a background thread.
+    """
+    def __init__(self, compact_after = 1000):
+        JSONStorage.__init__(self)
+        self.compact_after = compact_after
+        # Defines the journal state:
+        self.seq = 0
+        self.journal_length = 0
+        self.pending = []
+        self.journal_lock = threading.Lock()
+        self.compact_thread = None
+
+    def get_journal_path(self, file_path):
+        return file_path + '.journal'
+
+    # Returns the feed caches stored in the snapshot at 'file_path' with every
+    # newer journal record replayed on top:
+    def load(self, file_path):
+        self.wait()
+        seq, feed_caches = read_snapshot(file_path, self.streaming)
+        records = self.read_journal(file_path)
+        self.journal_length = len([record for record in records
+            if record['seq'] > seq])
+        self.file_path = file_path
+        self.seq = max([seq] + [record['seq'] for record in records])
+        self.pending = []
+        return replay_journal(feed_caches, records, seq)
+
+    # Returns the records in the journal next to 'file_path', ignoring a
+    # partially written final record:
+    def read_journal(self, file_path):
+        records = []
+        try:
+            with open(self.get_journal_path(file_path), 'r') as journal_file:
+                for line in journal_file:
+                    try:
+                        records.append(codec.loads(line))
+                    except ValueError:
+                        break
+        except FileNotFoundError:
+            pass
+        return records
+
+    # Appends pending changes to the journal, or writes a full snapshot if
+    # saving to a different file than the one loaded:
+    def save(self, database, file_path):
+        if file_path != self.file_path:
+            self.wait()
+            JSONStorage.save(self, database, file_path)
+            with self.journal_lock:
+                open(self.get_journal_path(file_path), 'w').close()
+            self.seq = 0
+            self.journal_length = 0
+            self.pending = []
+            return
+        if self.pending:
+            with self.journal_lock:
+                with open(self.get_journal_path(file_path), 'a') as journal_file:
+                    for record in self.pending:
+                        journal_file.write(codec.dumps(record) + '\n')
+                    journal_file.flush()
+                    os.fsync(journal_file.fileno())
+            self.journal_length += len(self.pending)
+            self.pending = []
+        if self.journal_length >= self.compact_after:
+            self.compact_background()
+
+    def reset(self):
+        self.wait()
+        JSONStorage.reset(self)
+        self.seq = 0
+        self.journal_length = 0
+        self.pending = []
+
+    def new_instance(self):
+        storage = JSONStorage.new_instance(self)
+        storage.compact_after = self.compact_after
+        return storage
+
+    # Queues a change record to be appended on the next save:
+    def record(self, record):
+        self.seq += 1
+        record['seq'] = self.seq
+        self.pending.append(record)
+
+    def record_register(self, feed):
+        self.record({'op' : 'register', 'feed' : feed.gen_cache()})
+
+    def record_delete(self, feed_url):
+        self.record({'op' : 'delete', 'url' : feed_url})
+
+    def record_feed(self, feed):
+        feed_cache = feed.gen_cache()
+        del feed_cache['episodes']
+        self.record({'op' : 'feed', 'url' : feed.url, 'feed' : feed_cache})
+
+    def record_mark_old(self, feed_url, episode_pkid):
+        self.record({'op' : 'mark_old', 'url' : feed_url, 'pkid' : episode_pkid})
+
+    def record_episodes(self, feed, episode_pkids):
+        if episode_pkids:
+            self.record({
+                'op' : 'episodes',
+                'url' : feed.url,
+                'episodes' : [[episode_pkid, feed.episodes[episode_pkid].gen_cache()]
+                    for episode_pkid in episode_pkids]
+                })
+
+    #---------------- ----- --- --- - - - -  -     -
+    # Compaction:
+
+    # Starts folding the journal into the snapshot on a background thread:
+    def compact_background(self):
+        if self.compact_thread and self.compact_thread.is_alive():
+            return
+        print ('JournalStorage:\tCompacting journal for: ' + self.file_path)
+        self.compact_thread = threading.Thread(
+            target = self.compact,
+            args = (self.file_path,)
+            )
+        self.compact_thread.start()
+        self.journal_length = 0
+
+    # Replays the journal into a new snapshot, then drops the records it
+    # contains from the journal. Only touches files, never the live database:
+    def compact(self, file_path):
+        try:
+            seq, feed_caches = read_snapshot(file_path)
+            records = self.read_journal(file_path)
+            feed_caches = replay_journal(feed_caches, records, seq)
+            seq = max([seq] + [record['seq'] for record in records])
+            write_snapshot(file_path, seq, feed_caches)
+            # Keeps any records appended while the snapshot was written:
+            journal_path = self.get_journal_path(file_path)
+            with self.journal_lock:
+                records = [record for record in self.read_journal(file_path)
+                    if record['seq'] > seq]
+                with open(journal_path + '.tmp', 'w') as journal_file:
+                    for record in records:
+                        journal_file.write(codec.dumps(record) + '\n')
+                    journal_file.flush()
+                    os.fsync(journal_file.fileno())
+                os.replace(journal_path + '.tmp', journal_path)
+        except:
+            print ('JournalStorage:\tFailed to compact journal for: ' + file_path)
+
+    # Blocks until any running compaction has finished:
+    def wait(self):
+        if self.compact_thread:
+            self.compact_thread.join()
+            self.compact_thread = None
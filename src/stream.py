@@ -20,6 +20,8 @@
 #------------------------------------------------------------------------------#
 
 import sys
+import time
+import threading
 try:
     # Loading Gst
     from gi.repository import Gst
@@ -28,25 +30,101 @@ except:
     print ("Error: Failed to load GStreamer bindings for Python.")
     sys.exit(1)
 
+#------------------------------------------------------------------------------#
+#     The following function creates the element a 'Stream' plays into. Sinks
+#   are named by the short names below, by 'GStreamer' element name (eg:
+#   'osxaudiosink') or as 'file:<path>' to encode the audio to a file chosen
+#   by its extension ('.wav', '.ogg' or '.flac'; anything else is written as
+#   raw samples). 'fake' discards the audio, so a stream runs headless on a
+#   machine without sound hardware.
+#------------------------------------------------------------------------------#
+
+AUDIO_SINKS = {
+    'pulse' : 'pulsesink',
+    'alsa' : 'alsasink',
+    'auto' : 'autoaudiosink',
+    'fake' : 'fakesink'
+    }
+
+FILE_ENCODERS = {
+    '.wav' : 'wavenc',
+    '.ogg' : 'vorbisenc ! oggmux',
+    '.flac' : 'flacenc'
+    }
+
+# Returns a new audio sink element. 'sync' plays the audio at its real speed
+# when it is discarded ('fake'), rather than as fast as it can be decoded:
+def make_audio_sink (audio_sink, sync = True):
+    if audio_sink.startswith('file:'):
+        file_path = audio_sink[len('file:'):]
+        extension = file_path[file_path.rfind('.'):].lower()
+        description = 'audioconvert ! audioresample'
+        if extension in FILE_ENCODERS:
+            description += ' ! ' + FILE_ENCODERS[extension]
+        try:
+            sink = Gst.parse_bin_from_description(
+                description + ' ! filesink name=file', True)
+            sink.get_by_name('file').set_property('location', file_path)
+            return sink
+        except:
+            print ('Stream:\t\tFailed to create a file sink for "'
+                + file_path + '".')
+            sink = None
+    else:
+        sink = Gst.ElementFactory.make(
+            AUDIO_SINKS.get(audio_sink, audio_sink), 'sink')
+    if sink == None:
+        print ('Stream:\t\tAudio sink "' + audio_sink
+            + '" is not available, discarding audio instead.')
+        sink = Gst.ElementFactory.make('fakesink', 'sink')
+    if sink.get_factory().get_name() == 'fakesink':
+        sink.set_property('sync', sync)
+    return sink
+
 #------------------------------------------------------------------------------#
 
+# Seconds after which a seek that has not completed is no longer waited for:
+SEEK_TIMEOUT = 2
+
+# The range of playback rates:
+MIN_RATE = 0.5
+MAX_RATE = 4.0
+
+# Silence trimming: audio which stays quiet for longer than 'MIN_SILENCE'
+# seconds is skipped, so each gap is shortened to 'MIN_SILENCE' seconds. A
+# 16 bit sample is quiet if it lies within 256 of zero (about -42 dB below
+# full scale), ie: if its high byte is one of 'QUIET_HIGH_BYTES'. Checking the
+# high bytes needs no per-sample Python code:
+MIN_SILENCE = 0.5
+QUIET_HIGH_BYTES = b'\x00\xff'
+
 class Stream(object):
     """
     An implementation to stream remote audio using GStreamer. Provides the
-    necessary methods to set a stream's url and control playback.
+    necessary methods to set a stream's url and control playback. A url
+    queued with 'set_next()' is handed to the player as the current one runs
+    out, so playback continues into it without a gap.
+    'audio_sink' names the output (see 'make_audio_sink()'), eg: 'fake' to
+    run headless.
     """
 
-    def __init__(self):
+    def __init__(self, audio_sink = 'pulse', sync = True):
         print ('Initializing GStreamer interface.')
 
         # Instantiates the 'GStreamer' player 'engine' and defines the current
-        #   output sink as 'pulseaudio':
+        #   output sink (normally 'pulseaudio'):
         self.engine = Gst.ElementFactory.make('playbin', 'player')
-        self.engine.set_property(
-            'audio-sink',
-            Gst.ElementFactory.make('pulsesink', 'pulse'
-                )
-            )
+        self.engine.set_property('audio-sink',
+            make_audio_sink(audio_sink, sync))
+        # Keeps the pitch of voices when playing faster or slower than normal
+        # (the filter passes audio through untouched at the normal rate):
+        self.tempo_filter = Gst.ElementFactory.make('scaletempo', 'tempo')
+        if not self.tempo_filter:
+            print ('Stream:\t\t"scaletempo" is not available, so changing '
+                'the playback rate will change the pitch.')
+        self.audio_filter = None
+        self.apply_audio_filter(self.tempo_filter)
+        self.engine.connect('about-to-finish', self.on_about_to_finish)
 
         # Instantiates the 'GStreamer' 'bus':
         bus = self.engine.get_bus()
@@ -58,23 +136,164 @@ class Stream(object):
         self.player_state = 'NULL'
         self.channel_url = 'NULL'
 
-    # Handler is disabled for now because I don't need it.
+        # Defines the auto-advance state. 'about-to-finish' is emitted from a
+        # streaming thread, so the queued urls are guarded by a lock:
+        self.next_url = None
+        self.advancing_url = None
+        self.advance_lock = threading.Lock()
+        # Called on the main loop with the new url when playback moves on to
+        # the queued url, or with 'None' when playback reaches the end:
+        self.advance_callback = None
+        # Called on the main loop with the error message when playback fails
+        # and the stream has stopped (if unset, 'advance_callback' is called
+        # with 'None' instead):
+        self.error_callback = None
+
+        # Caches the duration (in seconds, 'None' until known) so position
+        # updates only query the position. 'duration_callback' is called on
+        # the main loop whenever the cached duration changes:
+        self.duration = None
+        self.duration_callback = None
+
+        # Defines the seek state. Only one flushing seek is sent at a time:
+        # requests made while it is in flight (or before the pipeline has
+        # prerolled) replace each other as 'queued_seek', a tuple with the
+        # position and whether it must be accurate, which is sent once the
+        # pipeline prerolls. 'seek_position' is the latest requested position
+        # (in seconds), reported as the position until it has been reached:
+        self.prerolled = False
+        self.seek_time = None
+        self.queued_seek = None
+        self.seek_position = None
+
+        # Defines the playback rate and the rate the pipeline has been told
+        # to play at (each new url starts at the normal rate, so the rate is
+        # sent with a seek once it has prerolled):
+        self.rate = 1.0
+        self.applied_rate = 1.0
+
+        # Defines silence trimming. The trimming filter is only built and put
+        # in the pipeline while 'trim_silence' is set, and is applied when a
+        # url is set. Silent audio is dropped in a streaming thread, which
+        # moves later audio earlier by adjusting 'trim_pad''s running time
+        # offset (in nanoseconds). 'trimmed_time' counts the seconds skipped
+        # from the current url. The offset and counters are shared with the
+        # streaming thread, so they are guarded by a lock:
+        self.trim_silence = False
+        self.trim_filter = None
+        self.trim_pad = None
+        self.trim_offset = 0
+        self.silent_time = 0
+        self.trimmed_time = 0.0
+        self.trim_lock = threading.Lock()
+
+    # Handles bus messages (delivered on the main loop):
     def gst_message_handler (self, bus, message):
-        # if message.type == Gst.MessageType.STATE_CHANGED:
-        #     old, new, pending = message.parse_state_changed()
-        # elif (message.type is Gst.MessageType.DURATION_CHANGED
-        #     and (engine_state is Gst.State.PLAYING
-        #         or engine_state is Gst.State.PAUSED)):
-        #     print ('Stream:\t\tDuration changed and player can play.')
-        #     self.refresh_duration()
-        pass
+        if message.type == Gst.MessageType.STREAM_START:
+            # The queued url has started playing:
+            with self.advance_lock:
+                channel_url = self.advancing_url
+                self.advancing_url = None
+            if channel_url:
+                self.channel_url = channel_url
+                self.duration = None
+                self.queued_seek = None
+                self.seek_position = None
+                self.applied_rate = 1.0
+                if self.rate != 1.0:
+                    self.send_rate()
+                print ('Stream:\t\tAdvanced to "' + channel_url + '"')
+                if self.advance_callback:
+                    self.advance_callback(channel_url)
+        elif message.type == Gst.MessageType.EOS:
+            print ('Stream:\t\tEnd of stream.')
+            self.engine.set_state(Gst.State.READY)
+            self.player_state = 'READY'
+            if self.advance_callback:
+                self.advance_callback(None)
+        elif message.type == Gst.MessageType.ERROR:
+            # Playback failed (eg: a bad uri or unreachable media), so stops:
+            error = message.parse_error()[0]
+            print ('Stream:\t\tPlayback error: ' + error.message)
+            self.engine.set_state(Gst.State.READY)
+            self.player_state = 'READY'
+            with self.advance_lock:
+                self.next_url = None
+                self.advancing_url = None
+            self.prerolled = False
+            self.seek_time = None
+            self.queued_seek = None
+            self.seek_position = None
+            if self.error_callback:
+                self.error_callback(error.message)
+            elif self.advance_callback:
+                self.advance_callback(None)
+        elif message.type == Gst.MessageType.DURATION_CHANGED:
+            self.duration = None
+            self.refresh_duration()
+        elif message.type == Gst.MessageType.ASYNC_DONE:
+            # The pipeline has prerolled (after starting or after a seek), so
+            # the latest queued seek can be sent:
+            self.prerolled = True
+            self.seek_time = None
+            if self.queued_seek:
+                position, accurate = self.queued_seek
+                self.queued_seek = None
+                self.send_seek(position, accurate)
+            else:
+                self.seek_position = None
+                if self.rate != self.applied_rate:
+                    self.send_seek(self.query_position() or 0, True)
+            if self.duration == None:
+                self.refresh_duration()
+
+    # Hands the queued url to the player once the current one has been read
+    # completely, so it prerolls while the rest of the current one plays:
+    def on_about_to_finish (self, engine):
+        with self.advance_lock:
+            if self.next_url:
+                engine.set_property('uri', self.next_url)
+                self.advancing_url = self.next_url
+                self.next_url = None
 
     # Sets the current channel url:
     def set (self, channel_url):
+        with self.advance_lock:
+            self.next_url = None
+            self.advancing_url = None
+        if self.trim_silence:
+            self.apply_audio_filter(self.get_trim_filter())
+        else:
+            self.apply_audio_filter(self.tempo_filter)
+        with self.trim_lock:
+            self.trim_offset = 0
+            self.silent_time = 0
+            self.trimmed_time = 0.0
+            if self.trim_pad:
+                self.trim_pad.set_offset(0)
         self.engine.set_property('uri', channel_url)
         self.channel_url = channel_url
+        self.duration = None
+        self.prerolled = False
+        self.seek_time = None
+        self.queued_seek = None
+        self.seek_position = None
+        self.applied_rate = 1.0
         print ('Stream:\t\tStream URL set to "' + channel_url + '"')
 
+    # Starts the current url at 'position' (in seconds) once it has prerolled:
+    def seek_on_preroll (self, position):
+        if position:
+            print ('Stream:\t\tResuming at ' + str(position) + ' s')
+            self.set_position(position, False)
+
+    # Queues the url to play when the current one ends ('None' to stop):
+    def set_next (self, next_url):
+        with self.advance_lock:
+            self.next_url = next_url
+        if next_url:
+            print ('Stream:\t\tNext URL set to "' + next_url + '"')
+
     # Begins streaming playback:
     def play (self):
         print ('Stream:\t\tplay()')
@@ -104,36 +323,187 @@ class Stream(object):
         self.player_state = 'NULL'
         self.set('NULL')
 
-    # Skips forward 30 seconds.
+    # Skips forward 30 seconds (from the last requested position, so repeated
+    # skips add up while a seek is in flight):
     def ffwd (self):
-        duration, position = self.get_position()
-        position += 30
-        self.set_position(position)
+        position = self.query_position()
+        if position != None:
+            position += 30
+            if self.duration:
+                position = min(position, self.duration)
+            self.set_position(position)
 
     # Skips backward 30 seconds.
     def rwnd (self):
-        duration, position = self.get_position()
-        position -= 30
-        self.set_position(position)
+        position = self.query_position()
+        if position != None:
+            self.set_position(position - 30)
 
-    # Returns a tuple with the position and the duration of the stream:
-    def get_position (self):
-        # Perform duration query:
+    # Queries the duration of the stream and caches it once known:
+    def refresh_duration (self):
         duration_query = self.engine.query_duration(Gst.Format.TIME)
-        if duration_query[0]:
+        if duration_query[0] and duration_query[1] >= 0:
             duration = duration_query[1] / Gst.SECOND
-        else:
-            duration = 0
-        # Perform position query:
+            if duration != self.duration:
+                self.duration = duration
+                if self.duration_callback:
+                    self.duration_callback(duration)
+
+    # Returns the cached duration of the stream (in seconds, '0' if unknown):
+    def get_duration (self):
+        if self.duration == None:
+            self.refresh_duration()
+        return self.duration or 0
+
+    # Returns the position of the stream (in seconds), or 'None' if unknown. A
+    # requested seek's position is returned until the seek has completed:
+    def query_position (self):
+        if self.seek_position != None:
+            return self.seek_position
         position_query = self.engine.query_position(Gst.Format.TIME)
         if position_query[0]:
-            position = position_query[1] / Gst.SECOND
-        else:
-            position = 0
+            return position_query[1] / Gst.SECOND
+
+    # Returns a tuple with the position and the duration of the stream:
+    def get_position (self):
+        duration = self.get_duration()
+        # Perform position query:
+        position = self.query_position() or 0
         # Return both.
         # print ('Stream:\t\t[', position, ',', duration, ']')
         return (duration, position)
 
-    # Sets the feed to an arbitrary position (in seconds):
-    def set_position (self, raw_seconds):
-        self.engine.seek_simple(Gst.Format.TIME, Gst.SeekFlags.FLUSH | Gst.SeekFlags.KEY_UNIT, raw_seconds * Gst.SECOND)
\ No newline at end of file
+    # Seeks to a position (in seconds). Key-unit seeks ('accurate' false) land
+    # on the nearest keyframe and are cheaper, eg: while the slider is being
+    # dragged. A seek requested while another is in flight is queued, and
+    # replaces any seek queued before it:
+    def set_position (self, raw_seconds, accurate = True):
+        position = max(0, raw_seconds)
+        self.seek_position = position
+        if (self.seek_time != None
+            and time.monotonic() - self.seek_time > SEEK_TIMEOUT):
+            # The seek never completed, so stops waiting for it:
+            self.seek_time = None
+        if not self.prerolled or self.seek_time != None:
+            self.queued_seek = (position, accurate)
+        else:
+            self.send_seek(position, accurate)
+
+    # Turns silence trimming on or off from the next url set (the pipeline
+    # only takes a new filter while stopped):
+    def set_trim_silence (self, trim_silence):
+        self.trim_silence = trim_silence
+
+    # Returns the seconds of silence skipped from the current url so far and
+    # starts counting again:
+    def take_trimmed_time (self):
+        with self.trim_lock:
+            trimmed_time = self.trimmed_time
+            self.trimmed_time = 0.0
+        return trimmed_time
+
+    # Returns the seconds of silence skipped from the current url so far:
+    def get_trimmed_time (self):
+        with self.trim_lock:
+            return self.trimmed_time
+
+    # Makes 'audio_filter' playbin's audio filter (if it is not already):
+    def apply_audio_filter (self, audio_filter):
+        if audio_filter is not self.audio_filter:
+            self.engine.set_property('audio-filter', audio_filter)
+            self.audio_filter = audio_filter
+
+    # Returns the silence trimming filter, building it the first time (or the
+    # tempo filter, if it cannot be built). Audio is converted to 16 bit
+    # samples after the tempo is changed, so each buffer's duration is the
+    # time it takes to play:
+    def get_trim_filter (self):
+        if self.trim_filter:
+            return self.trim_filter
+        description = ('audioconvert ! capsfilter name=trim '
+            'caps=audio/x-raw,format=S16LE')
+        if self.tempo_filter:
+            description = 'scaletempo ! ' + description
+        try:
+            self.trim_filter = Gst.parse_bin_from_description(description, True)
+            self.trim_pad = self.trim_filter.get_by_name('trim').get_static_pad(
+                'src')
+            self.trim_pad.add_probe(
+                Gst.PadProbeType.BUFFER | Gst.PadProbeType.EVENT_FLUSH,
+                self.on_trim_probe)
+            return self.trim_filter
+        except:
+            print ('Stream:\t\tFailed to create the silence trimming filter.')
+            self.trim_filter = None
+            self.trim_pad = None
+            self.trim_silence = False
+            return self.tempo_filter
+
+    # Drops audio once it has been silent for longer than 'MIN_SILENCE'
+    # (called in a streaming thread for each buffer):
+    def on_trim_probe (self, pad, info):
+        if info.type & Gst.PadProbeType.EVENT_FLUSH:
+            # Seeks start again from the new position:
+            if info.get_event().type == Gst.EventType.FLUSH_STOP:
+                with self.trim_lock:
+                    self.trim_offset = 0
+                    self.silent_time = 0
+                    pad.set_offset(0)
+            return Gst.PadProbeReturn.OK
+        buffer = info.get_buffer()
+        duration = buffer.duration
+        if duration == Gst.CLOCK_TIME_NONE:
+            return Gst.PadProbeReturn.OK
+        high_bytes = buffer.extract_dup(0, buffer.get_size())[1::2]
+        with self.trim_lock:
+            if high_bytes.translate(None, QUIET_HIGH_BYTES):
+                self.silent_time = 0
+                return Gst.PadProbeReturn.OK
+            self.silent_time += duration
+            if self.silent_time <= MIN_SILENCE * Gst.SECOND:
+                return Gst.PadProbeReturn.OK
+            # Plays the audio after this buffer earlier by its duration:
+            self.trim_offset -= duration
+            pad.set_offset(self.trim_offset)
+            self.trimmed_time += duration / Gst.SECOND
+        return Gst.PadProbeReturn.DROP
+
+    # Sets the playback rate (eg: '1.5' plays half again as fast). Positions
+    # and durations stay in the stream's own time:
+    def set_rate (self, rate):
+        rate = min(MAX_RATE, max(MIN_RATE, rate))
+        if rate == self.rate:
+            return
+        print ('Stream:\t\tPlayback rate set to ' + str(rate))
+        self.rate = rate
+        if self.prerolled:
+            position = self.query_position()
+            if position != None:
+                self.set_position(position)
+
+    # Sends the current rate to the pipeline without moving or flushing it, so
+    # the audio already queued plays on (used as playback moves on to a queued
+    # url, whose segment starts at the normal rate):
+    def send_rate (self):
+        if self.engine.seek(self.rate, Gst.Format.TIME, Gst.SeekFlags.NONE,
+            Gst.SeekType.NONE, -1, Gst.SeekType.NONE, -1):
+            self.applied_rate = self.rate
+        else:
+            print ('Stream:\t\tFailed to set the playback rate to '
+                + str(self.rate))
+
+    # Sends a flushing seek at the current rate to the pipeline:
+    def send_seek (self, position, accurate):
+        if accurate:
+            flags = Gst.SeekFlags.FLUSH | Gst.SeekFlags.ACCURATE
+        else:
+            flags = (Gst.SeekFlags.FLUSH | Gst.SeekFlags.KEY_UNIT
+                | Gst.SeekFlags.SNAP_NEAREST)
+        if self.engine.seek(self.rate, Gst.Format.TIME, flags,
+            Gst.SeekType.SET, int(position * Gst.SECOND),
+            Gst.SeekType.NONE, -1):
+            self.seek_time = time.monotonic()
+            self.applied_rate = self.rate
+        else:
+            print ('Stream:\t\tSeek to ' + str(position) + ' s failed.')
+            self.seek_position = None